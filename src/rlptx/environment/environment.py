@@ -7,7 +7,7 @@ import gymnasium as gym
 from rlptx.ptx.commodity import Commodity
 from rlptx.ptx.component import ConversionComponent, GenerationComponent, StorageComponent
 from rlptx.ptx.framework import PtxSystem
-from rlptx.environment.weather import WeatherDataProvider
+from rlptx.environment.weather import WeatherDataProvider, WEATHER_TIME_COLUMNS
 from rlptx.logger import log, Level
 from rlptx.util import contains_only_unique_elements
 
@@ -35,6 +35,8 @@ class Environment(ABC):
         self.episode = 1
         self.step = 0
         self.current_episode_reward = 0.
+        # index in a vector environment, which is added to the episode logs to tell the environments apart
+        self.vector_index = None
     
     @abstractmethod
     def initialize(self, seed: int | None = None) -> tuple[Any, dict[str, Any]]:
@@ -108,6 +110,8 @@ class GymEnvironment(Environment):
                 log(f"Total episode reward: {self.current_episode_reward:.4f}")
                 episode_msg = (f"Episode {self.episode} - Total reward: {self.current_episode_reward:.4f} " + 
                                f"- Reward/Step: {(self.current_episode_reward / self.step):.4f} (Steps: {self.step})")
+                if self.vector_index is not None:
+                    episode_msg += f" - Env: {self.vector_index}"
                 log(episode_msg, loggername="episode")
         return observation, reward, terminated, truncated, info
     
@@ -162,6 +166,14 @@ UPPER_BOUND = 100
 MAX_PROBABLE_REVENUE = 17.5
 MAX_PROBABLE_LEFTOVER_COMMODITIES = 500
 
+
+def _scale_observation(observation, lower_bounds, upper_bounds, slopes):
+    """Scale the observation with its bounds to [-1, 1] by performing a linear conversion 
+    with the same arithmetic and clamping as np.interp."""
+    scaled = slopes * (observation - lower_bounds) - 1
+    return np.where(observation < lower_bounds, -1., np.where(observation >= upper_bounds, 1., scaled))
+
+
 class PtxEnvironment(Environment):
     """Environment simulating a PtX system. The environment is flexible regarding 
     the exact configuration of the system and allows for its attributes (i.e. observations) 
@@ -211,7 +223,7 @@ class PtxEnvironment(Environment):
         self._original_ptx_system = ptx_system
         self.ptx_system = copy(self._original_ptx_system)
         assert contains_only_unique_elements(
-            self.ptx_system.get_all_commodity_names() + self.ptx_system.get_all_component_names()
+            list(self.ptx_system.get_all_commodity_names()) + list(self.ptx_system.get_all_component_names())
         ), "All elements of the ptx system must have a unique name."
         
         self.initializations = 0
@@ -233,6 +245,13 @@ class PtxEnvironment(Environment):
         reward_info = (-100., float("inf")) # reward range
         super().__init__(0, observation_space_spec, observation_space_info, action_space_size, 
                          action_space_spec, action_space_info, reward_spec, reward_info, seed)
+        # bounds of all observations as arrays to scale them together in each step
+        self._observation_lower_bounds = np.asarray(observation_space_spec["low"], dtype=np.float64)
+        self._observation_upper_bounds = np.asarray(observation_space_spec["high"], dtype=np.float64)
+        bound_ranges = self._observation_upper_bounds - self._observation_lower_bounds
+        self._observation_slopes = np.divide(
+            2., bound_ranges, out=np.zeros_like(bound_ranges), where=bound_ranges > 0
+        )
         self.observation_space_size  = len(self._get_current_observation())   
         log(f"Observation space: {observation_space_info}")
         log(f"Action space: {action_space_info}")
@@ -253,7 +272,9 @@ class PtxEnvironment(Environment):
     
     def reset(self):
         """Reset the environment, go to the next episode and return the new initial 
-        observation. This method should be called when the environment has terminated."""
+        observation. This method should be called when the environment has terminated. 
+        The ptx system of the previous episode is released, so references to it or its 
+        commodities must not be used anymore after the reset."""
         self.episode += 1
         self._init_new_episode(f"ENVIRONMENT RESET, EPISODE {self.episode}")
         observation = self._get_current_observation()
@@ -266,6 +287,8 @@ class PtxEnvironment(Environment):
         self.step = 0
         self.current_episode_reward = 0.
         self.current_episode_revenue = 0.
+        # reuse the commodities of the previous episode's system instead of allocating new ones
+        self.ptx_system.release_commodities()
         self.ptx_system = copy(self._original_ptx_system)
         self._action_space = self._get_action_space()
         self.weather_provider.set_random_offset(
@@ -318,8 +341,9 @@ class PtxEnvironment(Environment):
             current_step_stats["Revenue"] = round(balance_difference, 4)
             current_step_stats["Episode revenue"] = round(self.current_episode_revenue, 4)
             current_weather = self.ptx_system.get_current_weather_coefficient()
-            for name, value in current_weather.drop(["time", "dayofyear", "hour"]).items():
-                current_step_stats[name] = value
+            for name, value in current_weather._asdict().items():
+                if name not in WEATHER_TIME_COLUMNS:
+                    current_step_stats[name] = value
             self.stats_log.append(current_step_stats)
         
         # logging below
@@ -329,12 +353,15 @@ class PtxEnvironment(Environment):
             reward_msg = (f"Reward: {reward:.4f}, Current episode reward: "
                         f"{self.current_episode_reward:.4f}, "
                         f"Cumulative reward: {self.cumulative_reward:.4f}")
-            log(str(self.ptx_system) + "\n\t" + str(exact_completion_info) + "\n\t" + reward_msg)
+            log("%s\n\t%s\n\t%s", args=(self.ptx_system, exact_completion_info, reward_msg))
             log(f"Step {self.step}, Reward {reward:.4f} - {info}", loggername="status")
             log(reward_msg, loggername="reward")
             # log stats
             if self.evaluation_mode:
-                stats_msg = f"Cycle {self.initializations} Episode {self.episode} Step {self.step} - "
+                stats_msg = f"Cycle {self.initializations} Episode {self.episode} Step {self.step}"
+                if self.vector_index is not None:
+                    stats_msg += f" Env {self.vector_index}"
+                stats_msg += " - "
                 for attribute, value in self.stats_log[-1].items():
                     stats_msg += f"{attribute}: {value:.4f}, "
                 stats_msg = stats_msg[:-2] # remove trailing comma
@@ -348,6 +375,8 @@ class PtxEnvironment(Environment):
                 episode_msg = (f"Episode {self.episode} - Total reward: {self.current_episode_reward:.4f} "
                                f"- Reward/Step: {(self.current_episode_reward / self.step):.4f} - "
                                f"Steps: {self.step} - Total revenue: {self.current_episode_revenue:.4f}")
+                if self.vector_index is not None:
+                    episode_msg += f" - Env: {self.vector_index}"
                 loggername = "test" if self.evaluation_mode else "episode"
                 log(episode_msg, loggername=loggername, deferred=(log_mode == "deferred"))
         return observation, reward, self.terminated, self.truncated, info
@@ -605,12 +634,10 @@ class PtxEnvironment(Environment):
                     for log in self.ptx_system.available_commodities_conversion_log:
                         observation_space.append(log[element.name])
         
-        # scale observations with their bounds to [-1, 1] by performing a linear conversion
-        observation_space = [
-            np.interp(obs, [lower, upper], [-1, 1]) for obs, lower, upper in zip(observation_space, 
-                self.observation_space_spec["low"], self.observation_space_spec["high"])
-        ]
-        return observation_space
+        # scale all observations with their bounds to [-1, 1] at once
+        return _scale_observation(np.asarray(observation_space, dtype=np.float64), 
+                                  self._observation_lower_bounds, self._observation_upper_bounds, 
+                                  self._observation_slopes)
     
     ##### INITIALIZATION #####
     
@@ -748,8 +775,7 @@ class PtxEnvironment(Environment):
     
     def _determine_max_steps_per_episode(self, max_steps_per_episode):
         """Determine max steps per episode based on weather data size and weather forecast days."""
-        weather_data_length = len(self.weather_provider.weather_data_test if self.evaluation_mode 
-                                  else self.weather_provider.weather_data_train)
+        weather_data_length = self.weather_provider.get_data_length("test" if self.evaluation_mode else "train")
         if (max_steps_per_episode + self.weather_forecast_days > weather_data_length):
             max_steps_per_episode = weather_data_length - self.weather_forecast_days
         return max_steps_per_episode
@@ -0,0 +1,286 @@
+from copy import deepcopy
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import traceback
+import numpy as np
+
+from rlptx.environment.environment import Environment
+from rlptx.logger import disable_logger, disabled_loggers, forward_logs, pop_forwarded_logs, write_forwarded_logs
+
+
+# dtype of the observations returned by the vector environments, which is the one used by the agent
+OBSERVATION_DTYPE = np.float32
+
+
+class VectorEnvironment():
+    """Wrapper for multiple independent environments which are stepped together, so that the
+    agent can determine the actions for all of them with a single call on a batch of observations.
+    The environments are stepped one after another in this process. Their observations are 
+    returned with OBSERVATION_DTYPE like the ones of AsyncVectorEnvironment."""
+    
+    def __init__(self, envs: list[Environment]):
+        assert len(envs) > 0, "A vector environment needs at least one environment."
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.observation_space_size = envs[0].observation_space_size
+        self.action_space_size = envs[0].action_space_size
+    
+    @classmethod
+    def from_environment(cls, env, num_envs, seed=None):
+        """Create a vector environment with the given environment as its first environment and
+        num_envs - 1 copies of it. The copies use their own random number generators seeded
+        with seed + their index, so that their episodes differ from those of the original.
+        With more than one environment, the episode logs of each contain its index."""
+        return cls(_create_environments(env, num_envs, seed))
+    
+    def initialize(self, seed=None):
+        """Initialize all environments and return their initial observations stacked in an array
+        (and their infos in a list)."""
+        results = [env.initialize(seed=None if seed is None else seed + i) for i, env in enumerate(self.envs)]
+        observations, infos = zip(*results)
+        return np.stack(observations).astype(OBSERVATION_DTYPE, copy=False), list(infos)
+    
+    def reset(self):
+        """Reset all environments and return their new initial observations stacked in an array
+        (and their infos in a list)."""
+        observations, infos = zip(*(env.reset() for env in self.envs))
+        return np.stack(observations).astype(OBSERVATION_DTYPE, copy=False), list(infos)
+    
+    def reset_environment(self, index):
+        """Reset only the environment at the index and return its new initial observation and info."""
+        observation, info = self.envs[index].reset()
+        return np.asarray(observation, dtype=OBSERVATION_DTYPE), info
+    
+    def act(self, actions, **kwargs):
+        """Take one action in each environment and return their new observations, rewards,
+        terminateds and truncateds stacked in arrays (and their infos in a list)."""
+        results = [env.act(action, **kwargs) for env, action in zip(self.envs, actions)]
+        observations, rewards, terminateds, truncateds, infos = zip(*results)
+        return (np.stack(observations).astype(OBSERVATION_DTYPE, copy=False), 
+                np.asarray(rewards, dtype=np.float32), np.asarray(terminateds), np.asarray(truncateds), list(infos))
+    
+    def step_async(self, actions, **kwargs):
+        """Store the actions for the next call of step_wait, which steps the environments in this process."""
+        self._pending_step = (actions, kwargs)
+    
+    def step_wait(self):
+        """Take the actions given to step_async and return the results like act."""
+        actions, kwargs = self._pending_step
+        self._pending_step = None
+        return self.act(actions, **kwargs)
+    
+    def sample_action(self):
+        """Randomly sample one action for each environment."""
+        return np.asarray([env.sample_action() for env in self.envs], dtype=np.float32)
+    
+    def close(self):
+        """Nothing to release as the environments live in this process."""
+        pass
+
+
+class AsyncVectorEnvironment():
+    """Vector environment which runs each environment in its own worker process, so that their 
+    steps are computed in parallel. The workers write observations, rewards and done flags 
+    directly into arrays in shared memory, so only the actions and the (small) infos are 
+    pickled and sent through pipes on every step. The logs of the workers are sent back with 
+    their results and written by this process, so they end up in the same log files in the 
+    same order as with VectorEnvironment. The interface is the same as the one of 
+    VectorEnvironment, but the environments themselves are only available in the workers."""
+    
+    def __init__(self, envs: list[Environment]):
+        assert len(envs) > 0, "A vector environment needs at least one environment."
+        self.num_envs = len(envs)
+        self.observation_space_size = envs[0].observation_space_size
+        self.action_space_size = envs[0].action_space_size
+        self._shared_memory = []
+        self._observations = self._create_shared_array((self.num_envs, self.observation_space_size), OBSERVATION_DTYPE)
+        self._rewards = self._create_shared_array((self.num_envs,), np.float32)
+        self._terminateds = self._create_shared_array((self.num_envs,), np.bool_)
+        self._truncateds = self._create_shared_array((self.num_envs,), np.bool_)
+        shared_arrays = [(shm, array.shape, array.dtype) for shm, array in zip(self._shared_memory, (
+            self._observations, self._rewards, self._terminateds, self._truncateds
+        ))]
+        # spawn instead of fork so that the workers do not inherit the state of torch and the log thread
+        context = multiprocessing.get_context("spawn")
+        self._connections = []
+        self._processes = []
+        for index, env in enumerate(envs):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_run_environment_worker, name=f"environment-worker-{index}", daemon=True, 
+                args=(worker_connection, env, index, shared_arrays, set(disabled_loggers))
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._closed = False
+    
+    @classmethod
+    def from_environment(cls, env, num_envs, seed=None):
+        """Create an asynchronous vector environment from the given environment like 
+        VectorEnvironment.from_environment. The environments are pickled to their workers, 
+        so the given environment itself is not stepped."""
+        return cls(_create_environments(env, num_envs, seed))
+    
+    def _create_shared_array(self, shape, dtype):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = SharedMemory(create=True, size=size)
+        self._shared_memory.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    
+    def initialize(self, seed=None):
+        """Initialize all environments and return their initial observations stacked in an array
+        (and their infos in a list)."""
+        for i, connection in enumerate(self._connections):
+            connection.send(("initialize", None if seed is None else seed + i))
+        infos = self._receive_all()
+        return self._observations.copy(), infos
+    
+    def reset(self):
+        """Reset all environments and return their new initial observations stacked in an array
+        (and their infos in a list)."""
+        for connection in self._connections:
+            connection.send(("reset", None))
+        infos = self._receive_all()
+        return self._observations.copy(), infos
+    
+    def reset_environment(self, index):
+        """Reset only the environment at the index and return its new initial observation and info."""
+        self._connections[index].send(("reset", None))
+        info = self._receive(index)
+        return self._observations[index].copy(), info
+    
+    def act(self, actions, **kwargs):
+        """Take one action in each environment and return their new observations, rewards,
+        terminateds and truncateds stacked in arrays (and their infos in a list)."""
+        self.step_async(actions, **kwargs)
+        return self.step_wait()
+    
+    def step_async(self, actions, **kwargs):
+        """Send the actions to the workers, which step their environments while this process continues."""
+        for connection, action in zip(self._connections, actions):
+            connection.send(("act", (action, kwargs)))
+    
+    def step_wait(self):
+        """Wait for the steps started by step_async and return their results like act. The arrays 
+        are copied from the shared memory, as it is overwritten by the next step."""
+        infos = self._receive_all()
+        return (self._observations.copy(), self._rewards.copy(), self._terminateds.copy(), 
+                self._truncateds.copy(), infos)
+    
+    def sample_action(self):
+        """Randomly sample one action for each environment."""
+        for connection in self._connections:
+            connection.send(("sample_action", None))
+        return np.asarray(self._receive_all(), dtype=np.float32)
+    
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass # worker has already stopped
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        # the arrays must not be used anymore once their memory is released
+        self._observations = self._rewards = self._terminateds = self._truncateds = None
+        for shm in self._shared_memory:
+            shm.close()
+            shm.unlink()
+    
+    def _receive(self, index):
+        result, logs, error = self._connections[index].recv()
+        write_forwarded_logs(logs)
+        if error is not None:
+            self.close()
+            raise RuntimeError(f"Environment worker {index} failed:\n{error}")
+        return result
+    
+    def _receive_all(self):
+        return [self._receive(index) for index in range(self.num_envs)]
+
+
+def create_vector_environment(env, num_envs, seed=None, asynchronous=False):
+    """Create a vector environment with num_envs environments from the given environment. 
+    The environments are only run in worker processes if asynchronous is true and there is more 
+    than one environment, as a single environment cannot be stepped in parallel to anything."""
+    if asynchronous and num_envs > 1:
+        return AsyncVectorEnvironment.from_environment(env, num_envs, seed)
+    return VectorEnvironment.from_environment(env, num_envs, seed)
+
+
+def _create_environments(env, num_envs, seed=None):
+    """Return the environment and num_envs - 1 clones of it seeded with seed + their index. 
+    Each environment numbers its own episodes, so their logs contain the environment's 
+    index as an additional value to tell them apart if there is more than one."""
+    envs = [env] + [_clone_environment(env, None if seed is None else seed + i) for i in range(1, num_envs)]
+    for i, environment in enumerate(envs):
+        environment.vector_index = i if num_envs > 1 else None
+    return envs
+
+def _clone_environment(env, seed=None):
+    """Return a deep copy of the environment which shares the read-only weather data with it and
+    whose random number generators for actions and weather offsets are seeded with the seed."""
+    clone_memo = {}
+    weather_provider = getattr(env, "weather_provider", None)
+    if weather_provider is not None:
+        shared = [weather_provider.weather_data_train, weather_provider.weather_data_test, weather_provider._soa]
+        clone_memo = {id(data): data for data in shared}
+    clone = deepcopy(env, clone_memo)
+    clone.seed = seed
+    if hasattr(clone, "rng"):
+        clone.rng = np.random.default_rng(seed)
+    if weather_provider is not None:
+        clone.weather_provider.rng = np.random.default_rng(seed)
+    return clone
+
+def _run_environment_worker(connection, env, index, shared_arrays, disabled_loggers):
+    """Run the environment in a worker process of AsyncVectorEnvironment. Commands are received 
+    through the connection, the results of steps are written to the index of the shared arrays 
+    and everything else is sent back along with the logs of the command and the formatted 
+    exception if one occurred. The worker does not write any logs itself."""
+    for loggername in disabled_loggers:
+        disable_logger(loggername)
+    forward_logs()
+    shared_memory = [shm for shm, _, _ in shared_arrays]
+    observations, rewards, terminateds, truncateds = (
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm, shape, dtype in shared_arrays
+    )
+    try:
+        while True:
+            command, data = connection.recv()
+            result = None
+            try:
+                if command == "act":
+                    action, kwargs = data
+                    observation, rewards[index], terminateds[index], truncateds[index], result = \
+                        env.act(action, **kwargs)
+                    observations[index] = observation
+                elif command == "initialize":
+                    observations[index], result = env.initialize(seed=data)
+                elif command == "reset":
+                    observations[index], result = env.reset()
+                elif command == "sample_action":
+                    result = env.sample_action()
+                elif command == "close":
+                    break
+                else:
+                    raise ValueError(f"Unknown command '{command}'.")
+            except Exception:
+                connection.send((None, pop_forwarded_logs(), traceback.format_exc()))
+                break
+            connection.send((result, pop_forwarded_logs(), None))
+    except (KeyboardInterrupt, EOFError):
+        pass # main process was interrupted or has stopped
+    finally:
+        del observations, rewards, terminateds, truncateds
+        for shm in shared_memory:
+            shm.close()
+        connection.close()
@@ -1,16 +1,20 @@
+from collections import namedtuple
 from glob import glob
+from math import ceil
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
 from rlptx.util import DATA_DIR
 
 
 WEATHER_DATA_DIR = "yearly_profiles/"
+# columns of the weather data which do not contain the coefficient of an energy source
+WEATHER_TIME_COLUMNS = ("time", "dayofyear", "hour")
 
 
 class WeatherDataProvider():
-    """Wrapper for the weather data originally provided in multiple csv files."""
+    """Wrapper for the weather data originally provided in multiple csv files. The data is stored 
+    as a structure of arrays, i.e. one contiguous numpy array per column, instead of a dataframe."""
     
     def __init__(self, dir_data=WEATHER_DATA_DIR, ticks_per_day=24, test_size=0.1, offset=0, seed=None):
         """This class directly provides the weather data in train and test sets. 
@@ -20,54 +24,135 @@ class WeatherDataProvider():
         self.test_size = test_size
         self.offset = offset
         self.seed = seed
-        self.weather_data = self._load_data(dir_data)
-        self.weather_data_joined = pd.concat(self.weather_data, ignore_index=True)
-        # train and test data must not be shuffled as it is a time series
-        self.weather_data_train, self.weather_data_test = train_test_split(
-            self.weather_data_joined, test_size=test_size, random_state=seed, shuffle=False
-        )
+        # the yearly dataframes are only needed to fill the column arrays, so they are not kept
+        self._soa = self._join_data(self._load_data(dir_data))
+        self._length = len(self._soa["time"])
+        self._row_class = _create_row_class(self._soa.keys())
+        # train and test data must not be shuffled as it is a time series, so the split is a 
+        # single index with the test set at the end (rounded like sklearn's train_test_split)
+        self._train_end = self._length - ceil(self._length * test_size)
+        # the sets are dicts of views into the column arrays, so they do not copy any data
+        self.weather_data_train = {column: values[:self._train_end] for column, values in self._soa.items()}
+        self.weather_data_test = {column: values[self._train_end:] for column, values in self._soa.items()}
         self.rng = np.random.default_rng(seed)
     
     def set_random_offset(self, min_available_data, mode="train"):
         """Set the offset to a random value between 0 and the length of the data minus min_available_data. 
         Min_available_data is the minimal size of data that must be available after the offset."""
         assert mode in ["train", "test"], "Mode must be 'train' or 'test'."
-        data_length = len(self.weather_data_train if mode == "train" else self.weather_data_test)
+        data_length = self.get_data_length(mode)
         self.offset = self.rng.integers(0, data_length - min_available_data, endpoint=True)
     
+    def get_data_length(self, mode=None):
+        """Returns the amount of weather data points in the train or test set or in total if mode is None."""
+        assert mode in [None, "train", "test"], "Mode must be None, 'train' or 'test'."
+        if mode == "train":
+            return self._train_end
+        elif mode == "test":
+            return self._length - self._train_end
+        return self._length
+    
+    def get_data(self, mode=None):
+        """Returns the train or test set or all weather data if mode is None as a dict of column 
+        arrays. Unlike the other getters, the offset is not applied."""
+        assert mode in [None, "train", "test"], "Mode must be None, 'train' or 'test'."
+        if mode == "train":
+            return self.weather_data_train
+        elif mode == "test":
+            return self.weather_data_test
+        return self._soa
+    
     def get_weather_from_tick_plus_n(self, tick, n):
-        """Returns n weather data points starting from tick plus offset."""
+        """Returns n weather data points starting from tick plus offset as a dict of array views."""
         actual_tick = tick + self.offset
-        return self.weather_data_joined.iloc[actual_tick:actual_tick+n]
+        return {column: values[actual_tick:actual_tick+n] for column, values in self._soa.items()}
     
     def get_weather_of_tick(self, tick):
+        """Returns the weather data point of tick plus offset as a named tuple which can 
+        also be indexed by column name. The values are converted to python scalars."""
         actual_tick = tick + self.offset
-        return self.weather_data_joined.iloc[actual_tick]
+        return self._row_class._make(values.item(actual_tick) for values in self._soa.values())
     
     def get_weather_between_datetimes(self, datetime1, datetime2):
         """Returns all weather data points between datetime1 and datetime2 including these two."""
-        return self.weather_data_joined[self.weather_data_joined["time"].between(
-            pd.to_datetime(datetime1), pd.to_datetime(datetime2)
-        )]
+        mask = ((self._soa["time"] >= _to_epoch(datetime1)) 
+                & (self._soa["time"] <= _to_epoch(datetime2)))
+        return {column: values[mask] for column, values in self._soa.items()}
     
     def get_weather_of_datetime(self, datetime):
-        return self.weather_data_joined[
-            self.weather_data_joined["time"] == pd.to_datetime(datetime)
-    ]
+        mask = self._soa["time"] == _to_epoch(datetime)
+        return {column: values[mask] for column, values in self._soa.items()}
     
     def _load_data(self, dir_data):
-        """Load all yearly csv files into a list of dataframes."""
+        """Load all yearly csv files into a list of dataframes. Floats are stored as float32, 
+        the time as int32 hours since the epoch, and the day of year and hour as small uints."""
         file_paths = glob(str(DATA_DIR / dir_data / "*.csv"))
         file_paths.sort()
         data = []
         for file_path in file_paths:
-            yearly_data = pd.read_csv(file_path)
-            yearly_data["time"] = pd.to_datetime(yearly_data["time"])
-            yearly_data["dayofyear"] = yearly_data.index // self.ticks_per_day
-            yearly_data["hour"] = yearly_data["time"].dt.hour
+            # memory-map the file so it is parsed directly from the mapped pages
+            yearly_data = pd.read_csv(file_path, memory_map=True)
+            # downcast columns to the smallest sufficient types to reduce memory bandwidth
+            yearly_data = yearly_data.astype(
+                {column: np.float32 for column in yearly_data.select_dtypes("float64").columns}
+            )
+            # derive day of year and hour directly from the numeric time instead of the datetime accessor
+            hours = pd.to_datetime(yearly_data["time"]).to_numpy(dtype="datetime64[h]").view(np.int64)
+            yearly_data["time"] = hours.astype(np.int32)
+            yearly_data["dayofyear"] = (
+                np.arange(len(yearly_data), dtype=np.uint32) // self.ticks_per_day
+            ).astype(np.uint16)
+            yearly_data["hour"] = (hours % 24).astype(np.uint8)
             data.append(yearly_data)
         return data
+    
+    def _join_data(self, data):
+        """Join the yearly dataframes into one contiguous array per column by filling preallocated 
+        arrays instead of using pd.concat, which avoids its intermediate copies of every column."""
+        total_length = sum(len(yearly_data) for yearly_data in data)
+        columns = {column: np.empty(total_length, dtype=dtype) for column, dtype in data[0].dtypes.items()}
+        offset = 0
+        for yearly_data in data:
+            n = len(yearly_data)
+            for column, values in columns.items():
+                values[offset:offset+n] = yearly_data[column].to_numpy()
+            offset += n
+        return columns
+
+    def __getstate__(self):
+        """Pickle the provider without its row class, which cannot be pickled as it is created at 
+        runtime, and without the train and test sets, which would be pickled as copies of the data."""
+        state = self.__dict__.copy()
+        for attribute in ("_row_class", "weather_data_train", "weather_data_test"):
+            del state[attribute]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._row_class = _create_row_class(self._soa.keys())
+        self.weather_data_train = {column: values[:self._train_end] for column, values in self._soa.items()}
+        self.weather_data_test = {column: values[self._train_end:] for column, values in self._soa.items()}
 
     def __repr__(self):
         return (f"WeatherDataProvider(dir_data={self.dir_data!r}, ticks_per_day={self.ticks_per_day}, "
-                f"test_size={self.test_size}, seed={self.seed}, data_amount={len(self.weather_data_joined)})")
+                f"test_size={self.test_size}, seed={self.seed}, data_amount={self._length})")
+
+
+def _create_row_class(columns):
+    """Create a named tuple class for weather data points with the given columns as fields. 
+    Its items can be accessed by index, by attribute, or by column name like a dict."""
+    row_base = namedtuple("WeatherRow", columns)
+    
+    class WeatherRow(row_base):
+        __slots__ = ()
+        
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return getattr(self, key)
+            return super().__getitem__(key)
+    
+    return WeatherRow
+
+def _to_epoch(datetime):
+    """Convert a datetime (or string) to hours since the epoch like the stored time column."""
+    return pd.to_datetime(datetime).to_datetime64().astype("datetime64[h]").astype(np.int64)
@@ -1,12 +1,24 @@
+import mmap
+import os
+import re
+import numpy as np
 import pandas as pd
 
 from rlptx.util import PROJECT_DIR
 from rlptx.logger import LOGFILE_PATH
 
 
-def load_log(filename, type="episode", path=LOGFILE_PATH):
-    """Load a log from a txt file and return it as a dataframe."""
+# separators of the parts of a log line and of the key-value pairs in the message
+_SPLIT_DASH = re.compile(r" - ")
+_SPLIT_COMMA = re.compile(r", ")
+
+
+def load_log(filename, type="episode", path=LOGFILE_PATH, backend="pandas"):
+    """Load a log from a txt file and return it as a dataframe. With the cudf backend, the 
+    dataframe is moved to the gpu as float32 values, which only pays off for filtering 
+    logs with millions of rows. This requires the optional cudf package."""
     assert type in ["episode", "agent", "test", "evaluation"], "File is not of a valid log type."
+    assert backend in ["pandas", "cudf"], "Backend must be 'pandas' or 'cudf'."
     filepath = PROJECT_DIR / (path + filename + ".txt")
 
     if type in ["episode", "test"]:
@@ -16,37 +28,66 @@ def load_log(filename, type="episode", path=LOGFILE_PATH):
     elif type == "evaluation":
         line_func = _line_evaluation
     
-    # loop through the lines of the log file, get all key-value pairs put them into a dataframe
-    log = {}
-    with open(filepath, "r") as f:
-        lines = f.readlines()
-        for line in lines:
-            elements = line_func(line)
-            for element in elements:
-                name, value = element.split(": ", maxsplit=1)
-                if name in log.keys():
-                    log[name].append(value)
-                else:
-                    log[name] = [value]
+    # loop through the lines of the log file and parse the values of all key-value pairs directly 
+    # into a preallocated array (one row per line) instead of collecting them as strings first. 
+    # The columns are determined once from the first line with key-value pairs (header sniff). 
+    # The file is memory-mapped so its pages are read on demand without an extra python buffer.
+    columns = None
+    values = None
+    row = 0
+    if os.path.getsize(filepath) == 0: # empty files cannot be memory-mapped
+        return pd.DataFrame(dtype=float)
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_amount = _count_lines(mm)
+        for line in iter(mm.readline, b""):
+            pairs = line_func(line.decode())
+            if len(pairs) == 0:
+                continue
+            if columns is None:
+                columns = {name: i for i, (name, _) in enumerate(pairs)}
+                values = np.empty((line_amount, len(columns)), dtype=float)
+            # values of keys missing in a line are nan, keys not in the header are a schema drift
+            row_values = [np.nan] * len(columns)
+            try:
+                for name, value in pairs:
+                    row_values[columns[name]] = float(value)
+            except KeyError as e:
+                raise AssertionError(f"Line {row+1} with stats contains key {e} not found in the first line.")
+            values[row] = row_values
+            row += 1
     
-    log_df = pd.DataFrame(log, dtype=float)
+    if columns is None:
+        log_df = pd.DataFrame(dtype=float)
+    else:
+        log_df = pd.DataFrame(values[:row], columns=list(columns))
+    if backend == "cudf":
+        import cudf
+        log_df = cudf.from_pandas(log_df.astype(np.float32))
     return log_df
 
+def _count_lines(mm):
+    """Count the lines of a memory-mapped file, including a last line without a line break."""
+    buffer = np.frombuffer(mm, dtype=np.uint8)
+    line_amount = int(np.count_nonzero(buffer == ord("\n"))) + (buffer[-1] != ord("\n"))
+    del buffer # release the exported buffer so the mmap can be closed
+    return line_amount
+
 # Helper functions for parsing log lines of the different log types.
-# Each returns a list of elements in the form ["name1: value1", ...].
+# Each returns a list of key-value pairs in the form [("name1", "value1"), ...].
 
 def _line_episode_and_test(line):
     # ignore log lines before first or after last episode or not including stats
     if "reward" not in line:
         return []
-    return line.replace("\n", "").split(" - ")[4:]
+    return [element.split(": ", maxsplit=1) for element in _SPLIT_DASH.split(line.rstrip("\n"))[4:]]
 
 def _line_agent(line):
-    return line.replace("\n", "").split(" - ")[-1].split(", ")
+    elements = _SPLIT_COMMA.split(_SPLIT_DASH.split(line.rstrip("\n"))[-1])
+    return [element.split(": ", maxsplit=1) for element in elements]
 
 def _line_evaluation(line):
-    episode, elements = line.replace("\n", "").split(" - ")[-2:]
+    episode, elements = _SPLIT_DASH.split(line.rstrip("\n"))[-2:]
     episode = episode.split(" ")
-    episode = [f"{episode[i]}: {episode[i+1]}" for i in range(0, len(episode)-1, 2)]
-    episode.extend(elements.replace("_", " ").split(", "))
-    return episode
+    pairs = list(zip(episode[0::2], episode[1::2]))
+    pairs.extend([element.split(": ", maxsplit=1) for element in _SPLIT_COMMA.split(elements.replace("_", " "))])
+    return pairs
@@ -1,4 +1,8 @@
+import atexit
 import logging
+import threading
+import time
+from collections import deque
 from enum import Enum
 
 import rlptx.util as util
@@ -11,10 +15,74 @@ util.mkdir(LOGFILE_PATH)
 LOGFILE_NAME = 'log.txt'
 LOGGER_NAME = 'main'
 
+FILE_BUFFER_SIZE = 2**16 # bytes buffered by file handlers before writing to the file
+LOG_BUFFER_SIZE = 256 # amount of released logs in the buffer that triggers writing them
+LOG_FLUSH_INTERVAL = 0.5 # seconds after which released logs are written at the latest
+
 loggers = {}
-disabled_loggers = []
+disabled_loggers = set()
+
+# All logs are appended to this buffer and written in batches by a background thread when enough 
+# logs are buffered or the flush interval has passed. Only released logs are written this way: 
+# deferred logs are held back until the next non-deferred log or until flush_deferred_logs().
+deferred_logs = deque()
+_released_logs = 0 # amount of logs at the start of the buffer that may be written
+_buffer_lock = threading.Lock() # guards the buffer and the amount of released logs
+_write_lock = threading.Lock() # keeps the logs in order when writing from multiple threads
+_flush_event = threading.Event()
+_flush_thread = None
+_flush_thread_lock = threading.Lock() # makes sure only one flush thread is started
+# Logs of processes which forward their logs are collected here instead of being written, 
+# so that another process can write them to its loggers (see forward_logs).
+_forwarded_logs = None
 
-deferred_logs = []
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler which writes through a large block buffer instead of flushing the file 
+    after every record. The buffer is written when it is full, on flush() and on close(). 
+    By default, the file is only opened (and created) when the first record is written, 
+    so loggers which are configured but never written to do not create empty files."""
+    
+    def __init__(self, filename, mode="a", encoding=None, delay=True, buffer_size=FILE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+    
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size, 
+                    encoding=self.encoding, errors=self.errors)
+    
+    def emit(self, record):
+        """Same as FileHandler.emit but without flushing the stream after the record."""
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class FastFormatter(logging.Formatter):
+    """Formatter for the fixed log formats of this module. It fills the format with the record's 
+    attributes directly and formats the time only once per second instead of once per record."""
+    
+    def __init__(self, fmt, datefmt):
+        super().__init__(fmt, datefmt=datefmt)
+        self._last_second = None
+        self._last_time = None
+    
+    def format(self, record):
+        # use the generic formatting for records with additional exception or stack info
+        if record.exc_info or record.exc_text or record.stack_info:
+            return super().format(record)
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_time = time.strftime(self.datefmt, self.converter(record.created))
+        record.message = record.getMessage()
+        record.asctime = self._last_time
+        return self._fmt % record.__dict__
 
 
 # for easy use in log function
@@ -25,6 +93,9 @@ class Level(Enum):
     ERROR = logging.ERROR
     CRITICAL = logging.CRITICAL
 
+# resolve enum levels from this class to int levels from the logging module
+_LEVEL_MAP = {level: level.value for level in Level}
+
 
 def configure_logger(loggername, path=LOGFILE_PATH, filename=LOGFILE_NAME, 
                      console_level=logging.DEBUG, file_level=logging.INFO):
@@ -38,16 +109,16 @@ def configure_logger(loggername, path=LOGFILE_PATH, filename=LOGFILE_NAME,
     console_handler.setLevel(console_level)
 
     filename = (f"{util.get_timestamp()}_{loggername}_{filename}")
-    file_handler = logging.FileHandler(util.PROJECT_DIR / path / filename, mode='a')
+    file_handler = BufferedFileHandler(util.PROJECT_DIR / path / filename, mode='a')
     file_level = file_level.value if isinstance(file_level, Level) else file_level
     file_handler.setLevel(file_level)
 
-    console_formatter = logging.Formatter(
+    console_formatter = FastFormatter(
         '%(asctime)s - %(name)-8s - %(levelname)-5s - %(message)s', datefmt='%H:%M:%S'
     )
     console_handler.setFormatter(console_formatter)
 
-    file_formatter = logging.Formatter(
+    file_formatter = FastFormatter(
         '%(asctime)s - %(name)s - %(levelname)-8s - %(message)s', datefmt='%d-%m %H:%M:%S'
     )
     file_handler.setFormatter(file_formatter)
@@ -60,38 +131,104 @@ def configure_logger(loggername, path=LOGFILE_PATH, filename=LOGFILE_NAME,
 
 
 # provide simple logging utility from inside this module
-def log(message, loggername=LOGGER_NAME, level=logging.INFO, deferred=False):
+def log(message, loggername=LOGGER_NAME, level=logging.INFO, deferred=False, args=()):
     """Log a message to the given logger at the given log level if the logger is enabled. 
-    A new logger is created and used if the loggername does not exist yet. 
-    Deferring logs prevents immediately writing them to output; they will be written when 
-    flush_deferred_logs() is called. This prevents the interruption of progress bars."""
+    A new logger is created and used if the loggername does not exist yet. If args are given, 
+    the message is a %-format string which is only formatted if the log is actually emitted. 
+    Logs are buffered and written in batches shortly after. Deferring logs prevents writing 
+    them to output until flush_deferred_logs() is called or a non-deferred log follows. 
+    This prevents the interruption of progress bars."""
+    global _released_logs
     if loggername in disabled_loggers:
         return
 
     # handle enum from this class vs int from logging module
-    level = level.value if isinstance(level, Level) else level
-    if loggername not in loggers:
+    level = _LEVEL_MAP.get(level, level)
+    if _forwarded_logs is not None:
+        _forwarded_logs.append((loggername, level, message % args if args else message, deferred))
+        return
+    logger = loggers.get(loggername)
+    if logger is None:
         configure_logger(loggername)
+        logger = loggers[loggername]
+    elif not logger.isEnabledFor(level):
+        return
+    if args:
+        # format now as the objects in args may change before the buffered log is written
+        message = message % args
     
-    if not deferred:
-        # make sure all logs appear in the right order in the output by writing deferred ones first
-        flush_deferred_logs()
-        loggers[loggername].log(level, message)
-    else:
-        deferred_logs.append((loggername, level, message))
+    with _buffer_lock:
+        # store the logger itself so writing the log needs no further lookup by its name
+        deferred_logs.append((logger, level, message))
+        if not deferred:
+            # make sure all logs appear in the right order in the output by releasing deferred ones as well
+            _released_logs = len(deferred_logs)
+            if _released_logs >= LOG_BUFFER_SIZE:
+                _flush_event.set()
+    if _flush_thread is None:
+        _start_flush_thread()
 
 def flush_deferred_logs():
-    """Write all deferred logs to output."""
-    for loggername, level, message in deferred_logs:
-        loggers[loggername].log(level, message)
-    deferred_logs.clear()
+    """Write all buffered logs including the deferred ones to output."""
+    _write_logs(released_only=False)
+
+def forward_logs():
+    """Collect all following logs of this process instead of writing them. They are returned by 
+    pop_forwarded_logs() to be passed to another process, which writes them with write_forwarded_logs(). 
+    This is used by worker processes, so that they do not write to log files of their own."""
+    global _forwarded_logs
+    _forwarded_logs = []
+
+def pop_forwarded_logs():
+    """Return the logs collected since forward_logs() or the last call and clear them."""
+    global _forwarded_logs
+    logs = _forwarded_logs
+    _forwarded_logs = []
+    return logs
+
+def write_forwarded_logs(logs):
+    """Log the logs collected in another process as if they were logged in this one."""
+    for loggername, level, message, deferred in logs:
+        log(message, loggername, level, deferred)
+
+def _write_logs(released_only=True):
+    """Write the released or all buffered logs to their loggers in the order they were logged."""
+    global _released_logs
+    with _write_lock:
+        with _buffer_lock:
+            amount = _released_logs if released_only else len(deferred_logs)
+            records = [deferred_logs.popleft() for _ in range(amount)]
+            _released_logs = max(_released_logs - amount, 0)
+        for logger, level, message in records:
+            logger.log(level, message)
+        # write the file buffers once per batch instead of once per record
+        for logger in {logger for logger, _, _ in records}:
+            for handler in logger.handlers:
+                handler.flush()
+
+def _flush_periodically():
+    """Write released logs whenever the buffer is full or the flush interval has passed."""
+    while True:
+        _flush_event.wait(LOG_FLUSH_INTERVAL)
+        _flush_event.clear()
+        _write_logs()
+
+def _start_flush_thread():
+    global _flush_thread
+    with _flush_thread_lock:
+        if _flush_thread is not None: # another thread started it in the meantime
+            return
+        flush_thread = threading.Thread(target=_flush_periodically, name="log-flush", daemon=True)
+        flush_thread.start()
+        _flush_thread = flush_thread
 
 def reset_loggers():
-    """Remove all created loggers."""
+    """Write all buffered logs and remove all created loggers."""
     global loggers
+    flush_deferred_logs()
     for logger in loggers.values():
         try:
-            for handler in logger.handlers:
+            for handler in list(logger.handlers):
                 logger.removeHandler(handler)
                 handler.close()
             logging.root.manager.loggerDict.pop(logger.name)
@@ -99,19 +236,21 @@ def reset_loggers():
             print(e)
     loggers.clear()
 
+# write remaining buffered logs and close their files when the program exits
+atexit.register(reset_loggers)
+
 def disable_logger(loggername=None):
     """Disable logging to the given logger. If no loggername 
     is given, disable logging to all loggers."""
     if loggername is None:
-        global disabled_loggers
-        disabled_loggers = list(loggers.keys())
-    elif loggername not in disabled_loggers:
-        disabled_loggers.append(loggername)
+        disabled_loggers.update(loggers)
+    else:
+        disabled_loggers.add(loggername)
 
 def enable_logger(loggername=None):
     """Enable logging to the given logger. If no loggername 
     is given, enable logging to all loggers."""
     if loggername is None:
         disabled_loggers.clear()
-    elif loggername in disabled_loggers:
-        disabled_loggers.remove(loggername)
+    else:
+        disabled_loggers.discard(loggername)
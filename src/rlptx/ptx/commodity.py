@@ -1,16 +1,38 @@
 from rlptx.ptx.core import Element
+from rlptx.util import LazyStr
 
 
 # Upper bound for observations and actions can theoretically be infinite, but sac needs concrete values. 
 # Use arbitrary value not smaller than realistic possible quantities, but also not too large to scale properly.
 UPPER_BOUND = 100
+# Attributes which change during an episode and are zeroed when a commodity is released to the pool.
+QUANTITY_ATTRIBUTES = ("purchased_quantity", "purchase_costs", "sold_quantity", "selling_revenue", 
+                       "emitted_quantity", "available_quantity", "charged_quantity", "discharged_quantity", 
+                       "total_storage_costs", "produced_quantity", "consumed_quantity", 
+                       "total_production_costs", "generated_quantity", "total_generation_costs")
 
+# format strings of __str__ and __repr__ which are built once instead of on every call
+_STR_FORMAT = ("--%s--(purchased_quantity=%.4f, purchase_costs=%.4f, sold_quantity=%.4f, selling_revenue=%.4f, "
+               "emitted_quantity=%.4f, available_quantity=%.4f, charged_quantity=%.4f, discharged_quantity=%.4f, "
+               "total_storage_costs=%.4f, consumed_quantity=%.4f, produced_quantity=%.4f, "
+               "total_production_costs=%.4f, generated_quantity=%.4f, total_generation_costs=%.4f)")
+_REPR_FORMAT = ("Commodity(name=%r, commodity_unit=%r, emittable=%r, available=%r, purchasable=%r, "
+                "purchase_price=%r, saleable=%r, sale_price=%s, purchased_quantity=%r, purchase_costs=%r, "
+                "sold_quantity=%r, selling_revenue=%r, emitted_quantity=%r, available_quantity=%r, "
+                "charged_quantity=%r, discharged_quantity=%r, total_storage_costs=%r, consumed_quantity=%r, "
+                "produced_quantity=%r, total_production_costs=%r, generated_quantity=%r, "
+                "total_generation_costs=%r)")
 
 class Commodity(Element):
+    __slots__ = ("name", "commodity_unit", "emittable", "available", "purchasable", "purchase_price", 
+                 "saleable", "sale_price", "purchased_quantity", "purchase_costs", "sold_quantity", 
+                 "selling_revenue", "emitted_quantity", "available_quantity", "charged_quantity", 
+                 "discharged_quantity", "total_storage_costs", "produced_quantity", "consumed_quantity", 
+                 "total_production_costs", "generated_quantity", "total_generation_costs")
     
     def __init__(self, name, commodity_unit,
                  emittable=False, available=False, purchasable=False, 
-                 purchase_price=0, saleable=False, sale_price=0,
+                 purchase_price=0., saleable=False, sale_price=0.,
                  purchased_quantity=0., purchase_costs=0., sold_quantity=0., 
                  selling_revenue=0., emitted_quantity=0., available_quantity=0., 
                  charged_quantity=0., discharged_quantity=0., 
@@ -28,16 +50,18 @@ class Commodity(Element):
         :param purchase_price: [float or list] - fixed price or time varying price
         :param saleable: [boolean] - can be sold?
         :param sale_price: [float or list] - fixed price or time varying price
+        
+        Values are assigned as they are, use from_config to create a commodity from raw config values.
         """
         super().__init__()
         self.name = name
         self.commodity_unit = commodity_unit
-        self.emittable = bool(emittable)
-        self.available = bool(available)
-        self.purchasable = bool(purchasable)
-        self.purchase_price = float(purchase_price)
-        self.saleable = bool(saleable)
-        self.sale_price = float(sale_price)
+        self.emittable = emittable
+        self.available = available
+        self.purchasable = purchasable
+        self.purchase_price = purchase_price
+        self.saleable = saleable
+        self.sale_price = sale_price
         self.purchased_quantity = purchased_quantity
         self.purchase_costs = purchase_costs
         self.sold_quantity = sold_quantity
@@ -55,6 +79,16 @@ class Commodity(Element):
         self.total_generation_costs = total_generation_costs
         self.update_spec()
 
+    @classmethod
+    def from_config(cls, name, commodity_unit, emittable=False, available=False, purchasable=False, 
+                    purchase_price=0., saleable=False, sale_price=0., **kwargs):
+        """Create a commodity from raw config values by coercing them to their types once, 
+        so that the constructor and copies of the commodity do not need to do this."""
+        return cls(name=name, commodity_unit=commodity_unit, emittable=bool(emittable), 
+                   available=bool(available), purchasable=bool(purchasable), 
+                   purchase_price=float(purchase_price), saleable=bool(saleable), 
+                   sale_price=float(sale_price), **kwargs)
+
     def update_spec(self):
         """Set or update the observation and action specs for this commodity."""
         # Observation attributes of this class with their enabled flags, these can also just be booleans.
@@ -84,29 +118,34 @@ class Commodity(Element):
             Commodity.emit_commodity: ("emittable", 0, UPPER_BOUND)
         }
         self.assert_specs_match_class()
+        self.clear_spec_cache()
 
     def apply_action_method(self, method, ptx_system, values):
         """Actually apply the values returned by the action method to this component."""
-        if method == Commodity.purchase_commodity:
-            quantity, cost = values
-            self.purchased_quantity += quantity
-            self.available_quantity += quantity
-            self.purchase_costs += cost
-            ptx_system.balance -= cost
-            return True
-        if method == Commodity.sell_commodity:
-            quantity, revenue = values
-            self.available_quantity -= quantity
-            self.sold_quantity += quantity
-            self.selling_revenue += revenue
-            ptx_system.balance += revenue
-            return True
-        if method == Commodity.emit_commodity:
-            quantity = values[0]
-            self.available_quantity -= quantity
-            self.emitted_quantity += quantity
-            return True
-        return False
+        apply_method = self._ACTION_DISPATCH.get(method)
+        if apply_method is None:
+            return False
+        apply_method(self, ptx_system, values)
+        return True
+    
+    def _apply_purchase(self, ptx_system, values):
+        quantity, cost = values
+        self.purchased_quantity += quantity
+        self.available_quantity += quantity
+        self.purchase_costs += cost
+        ptx_system.balance -= cost
+    
+    def _apply_sell(self, ptx_system, values):
+        quantity, revenue = values
+        self.available_quantity -= quantity
+        self.sold_quantity += quantity
+        self.selling_revenue += revenue
+        ptx_system.balance += revenue
+    
+    def _apply_emit(self, ptx_system, values):
+        quantity = values[0]
+        self.available_quantity -= quantity
+        self.emitted_quantity += quantity
 
     def purchase_commodity(self, quantity, ptx_system):
         """Purchase quantity of commodity if available balance is sufficient. 
@@ -115,7 +154,7 @@ class Commodity(Element):
         Returns new values to be applied, status, whether purchasing the commodity succeeded, 
         and whether this action could be completed exactly as requested."""
         if quantity < 0:
-            return (0,0), f"Cannot purchase quantity {quantity:.4f} of {self.name}.", True, False
+            return (0,0), LazyStr("Cannot purchase quantity %.4f of %s.", (quantity, self.name)), True, False
         
         status = None
         exact_completion = True
@@ -124,14 +163,14 @@ class Commodity(Element):
             # try to purchase as much as possible
             new_quantity = ptx_system.balance / self.purchase_price
             new_cost = new_quantity * self.purchase_price
-            status = (f"Tried to purchase {quantity:.4f} {self.name} for {cost:.4f}€, "
-                      f"but only {ptx_system.balance:.4f}€ available. "
-                      f"Instead, purchase {new_quantity:.4f} for {new_cost:.4f}€.")
+            status = LazyStr("Tried to purchase %.4f %s for %.4f€, but only %.4f€ available. "
+                             "Instead, purchase %.4f for %.4f€.", 
+                             (quantity, self.name, cost, ptx_system.balance, new_quantity, new_cost))
             exact_completion = False
             quantity = new_quantity
             cost = new_cost
         else:
-            status = f"Purchased {quantity:.4f} {self.name} for {cost:.4f}€."
+            status = LazyStr("Purchased %.4f %s for %.4f€.", (quantity, self.name, cost))
         
         values = (quantity, cost)
         return values, status, True, exact_completion
@@ -143,21 +182,20 @@ class Commodity(Element):
         Returns new values to be applied, status, whether selling the commodity succeeded, 
         and whether this action could be completed exactly as requested."""
         if quantity < 0:
-            return (0,0), f"Cannot sell quantity {quantity:.4f} of {self.name}.", True, False
+            return (0,0), LazyStr("Cannot sell quantity %.4f of %s.", (quantity, self.name)), True, False
         
         status = None
         exact_completion = True
         if quantity > self.available_quantity:
             # try to sell as much as possible
             revenue = self.available_quantity * self.sale_price
-            status = (f"Tried to sell {quantity:.4f} {self.name}, but only "
-                      f"{self.available_quantity:.4f} available. Instead, "
-                      f"sell {self.available_quantity:.4f} for {revenue:.4f}€.")
+            status = LazyStr("Tried to sell %.4f %s, but only %.4f available. Instead, sell %.4f for %.4f€.", 
+                             (quantity, self.name, self.available_quantity, self.available_quantity, revenue))
             exact_completion = False
             quantity = self.available_quantity
         else:
             revenue = quantity * self.sale_price
-            status = f"Sold {quantity:.4f} {self.name} for {revenue:.4f}€."
+            status = LazyStr("Sold %.4f %s for %.4f€.", (quantity, self.name, revenue))
         
         values = (quantity, revenue)
         return values, status, True, exact_completion
@@ -169,51 +207,98 @@ class Commodity(Element):
         Returns new values to be applied, status, whether emitting the commodity succeeded, 
         and whether this action could be completed exactly as requested."""
         if quantity < 0:
-            return (0,), f"Cannot emit quantity {quantity:.4f} of {self.name}.", True, False
+            return (0,), LazyStr("Cannot emit quantity %.4f of %s.", (quantity, self.name)), True, False
         
         status = None
         exact_completion = True
         if quantity > self.available_quantity:
             # try to emit as much as possible
-            status = (f"Tried to emit {quantity:.4f} {self.name}, but only "
-                      f"{self.available_quantity:.4f} available. Instead, emit that much.")
+            status = LazyStr("Tried to emit %.4f %s, but only %.4f available. Instead, emit that much.", 
+                             (quantity, self.name, self.available_quantity))
             exact_completion = False
             quantity = self.available_quantity
         else:
-            status = f"Emit {quantity:.4f} {self.name}."
+            status = LazyStr("Emit %.4f %s.", (quantity, self.name))
         
         values = (quantity,)
         return values, status, True, exact_completion
 
+    # map action methods to the methods applying their values for a single lookup in apply_action_method
+    _ACTION_DISPATCH = {
+        purchase_commodity: _apply_purchase, 
+        sell_commodity: _apply_sell, 
+        emit_commodity: _apply_emit
+    }
+
     def __str__(self):
-        return (f"--{self.name}--(purchased_quantity={self.purchased_quantity:.4f}, purchase_costs={self.purchase_costs:.4f}, "
-                f"sold_quantity={self.sold_quantity:.4f}, selling_revenue={self.selling_revenue:.4f}, "
-                f"emitted_quantity={self.emitted_quantity:.4f}, available_quantity={self.available_quantity:.4f}, "
-                f"charged_quantity={self.charged_quantity:.4f}, discharged_quantity={self.discharged_quantity:.4f}, "
-                f"total_storage_costs={self.total_storage_costs:.4f}, consumed_quantity={self.consumed_quantity:.4f}, "
-                f"produced_quantity={self.produced_quantity:.4f}, total_production_costs={self.total_production_costs:.4f}, "
-                f"generated_quantity={self.generated_quantity:.4f}, total_generation_costs={self.total_generation_costs:.4f})")
+        return _STR_FORMAT % (
+            self.name, self.purchased_quantity, self.purchase_costs, self.sold_quantity, 
+            self.selling_revenue, self.emitted_quantity, self.available_quantity, self.charged_quantity, 
+            self.discharged_quantity, self.total_storage_costs, self.consumed_quantity, 
+            self.produced_quantity, self.total_production_costs, self.generated_quantity, 
+            self.total_generation_costs
+        )
 
     def __repr__(self):
-        return (f"Commodity(name={self.name!r}, commodity_unit={self.commodity_unit!r}, "
-                f"emittable={self.emittable!r}, available={self.available!r}, "
-                f"purchasable={self.purchasable!r}, purchase_price={self.purchase_price!r}, "
-                f"saleable={self.saleable!r}, sale_price={self.sale_price}, "
-                f"purchased_quantity={self.purchased_quantity!r}, purchase_costs={self.purchase_costs!r}, "
-                f"sold_quantity={self.sold_quantity!r}, selling_revenue={self.selling_revenue!r}, "
-                f"emitted_quantity={self.emitted_quantity!r}, available_quantity={self.available_quantity!r}, "
-                f"charged_quantity={self.charged_quantity!r}, discharged_quantity={self.discharged_quantity!r}, "
-                f"total_storage_costs={self.total_storage_costs!r}, consumed_quantity={self.consumed_quantity!r}, "
-                f"produced_quantity={self.produced_quantity!r}, total_production_costs={self.total_production_costs!r}, "
-                f"generated_quantity={self.generated_quantity!r}, total_generation_costs={self.total_generation_costs!r})")
+        return _REPR_FORMAT % (
+            self.name, self.commodity_unit, self.emittable, self.available, self.purchasable, 
+            self.purchase_price, self.saleable, self.sale_price, self.purchased_quantity, 
+            self.purchase_costs, self.sold_quantity, self.selling_revenue, self.emitted_quantity, 
+            self.available_quantity, self.charged_quantity, self.discharged_quantity, 
+            self.total_storage_costs, self.consumed_quantity, self.produced_quantity, 
+            self.total_production_costs, self.generated_quantity, self.total_generation_costs
+        )
+
+    @classmethod
+    def acquire(cls, pool=None, **kwargs):
+        """Return a commodity from the given pool (a list of released commodities) or a new one if 
+        there is no pool or it is empty with its slots set to the given values. The values are assigned 
+        as they are without any coercions, so they must contain at least all attributes which are not 
+        quantity attributes. Specs are rebuilt and tracked attributes are emptied unless they are given."""
+        if pool:
+            commodity = pool.pop()
+        else:
+            commodity = object.__new__(cls)
+            commodity._clear_quantities()
+        commodity._reset(**kwargs)
+        return commodity
+    
+    @classmethod
+    def release(cls, commodity, pool):
+        """Return a commodity which is not used anymore to the pool to be reused by acquire. 
+        The commodity must not be used afterwards, as it is changed when it is acquired again."""
+        commodity._clear_quantities()
+        commodity.tracked_attributes = {}
+        pool.append(commodity)
+    
+    def _reset(self, **kwargs):
+        for slot, value in kwargs.items():
+            object.__setattr__(self, slot, value)
+        if "observation_spec" not in kwargs or "action_spec" not in kwargs:
+            self.update_spec()
+        if "tracked_attributes" not in kwargs:
+            self.tracked_attributes = {}
+        self.clear_spec_cache()
+        self._tracked_attributes_split = None
+    
+    def _clear_quantities(self):
+        for attribute in QUANTITY_ATTRIBUTES:
+            object.__setattr__(self, attribute, 0.)
+
+    def clone(self, pool=None):
+        """Return a copy of this commodity including its tracked attributes, 
+        reusing a released commodity from the pool if one is given."""
+        clone = self._copy(pool)
+        clone.tracked_attributes = dict(self.tracked_attributes)
+        clone._tracked_attributes_split = self._tracked_attributes_split
+        return clone
 
     def __copy__(self):
-        return Commodity(name=self.name, commodity_unit=self.commodity_unit, emittable=self.emittable, 
-            available=self.available, purchasable=self.purchasable, purchase_price=self.purchase_price, 
-            saleable=self.saleable, sale_price=self.sale_price, purchased_quantity=self.purchased_quantity, 
-            purchase_costs=self.purchase_costs, sold_quantity=self.sold_quantity, selling_revenue=self.selling_revenue, 
-            emitted_quantity=self.emitted_quantity, available_quantity=self.available_quantity,  
-            charged_quantity=self.charged_quantity, discharged_quantity=self.discharged_quantity, 
-            total_storage_costs=self.total_storage_costs, consumed_quantity=self.consumed_quantity, 
-            produced_quantity=self.produced_quantity, total_production_costs=self.total_production_costs, 
-            generated_quantity=self.generated_quantity, total_generation_costs=self.total_generation_costs)
+        return self._copy()
+    
+    def _copy(self, pool=None):
+        # Attributes were already validated and coerced in __init__, so only copy the slots. 
+        # Specs get their own dicts because the ptx system adjusts them in place.
+        return Commodity.acquire(pool, **{slot: getattr(self, slot) for slot in Commodity.__slots__}, 
+                                 observation_spec=dict(self.observation_spec), 
+                                 action_spec=dict(self.action_spec), tracked_attributes={})
@@ -1,10 +1,20 @@
 import copy
+from functools import cache
 
 from rlptx.ptx.core import Element
 
 
+@cache
+def _get_component_slots(component_class):
+    """Return the slots added by the component classes in the mro of the given class."""
+    return tuple(slot for cls in component_class.__mro__ if issubclass(cls, BaseComponent) 
+                 for slot in cls.__dict__.get("__slots__", ()))
+
+
 class BaseComponent(Element):
     """Abstract base class for components which cannot be instantiated directly."""
+    __slots__ = ("name", "component_type", "variable_om", "has_cost", "fixed_capacity", 
+                 "total_variable_costs")
     
     def __init__(self, name, variable_om, fixed_capacity=0., total_variable_costs=0.):
         """
@@ -21,6 +31,12 @@ class BaseComponent(Element):
         self.fixed_capacity = float(fixed_capacity)
         self.total_variable_costs = float(total_variable_costs)
 
+    def clone(self):
+        clone = super().clone()
+        for slot in _get_component_slots(type(self)):
+            setattr(clone, slot, getattr(self, slot))
+        return clone
+
     def __copy__(self):
         return BaseComponent(name=self.name, variable_om=self.variable_om,
                              fixed_capacity=self.fixed_capacity,
@@ -28,6 +44,8 @@ class BaseComponent(Element):
 
 
 class ConversionComponent(BaseComponent):
+    __slots__ = ("inputs", "outputs", "main_input", "main_output", "commodities", "min_p", "max_p", 
+                 "ramp_down", "ramp_up", "load", "consumed_commodities", "produced_commodities")
     
     def __init__(self, name, variable_om=0., ramp_down=1., ramp_up=1., 
                  min_p=0., max_p=1., load=0., inputs=None, outputs=None, 
@@ -95,21 +113,26 @@ class ConversionComponent(BaseComponent):
             ConversionComponent.ramp_up_or_down: (True, -self.ramp_down, self.ramp_up)
         }
         self.assert_specs_match_class()
+        self.clear_spec_cache()
     
     def apply_action_method(self, method, ptx_system, values):
         """Actually apply the values returned by the action method to this component."""
         if method == ConversionComponent.ramp_up_or_down:
             quantity, cost, input_values, output_values = values
+            # look up the dicts once instead of for every input and output
+            consumed_commodities = self.consumed_commodities
+            produced_commodities = self.produced_commodities
+            main_output = self.main_output
             for input, amount in input_values:
                 input.available_quantity -= amount
                 input.consumed_quantity += amount
-                self.consumed_commodities[input.name] += amount
+                consumed_commodities[input.name] += amount
             for output, amount in output_values:
                 output.available_quantity += amount
                 output.produced_quantity += amount
-                if output.name == self.main_output:
+                if output.name == main_output:
                     output.total_production_costs += cost
-                self.produced_commodities[output.name] += amount
+                produced_commodities[output.name] += amount
             self.load += quantity
             self.total_variable_costs += cost
             ptx_system.balance -= cost
@@ -370,13 +393,13 @@ class ConversionComponent(BaseComponent):
 
         for commodity in self.commodities:
             if (
-                commodity in [*self.inputs.keys()] and 
-                commodity not in [*self.consumed_commodities.keys()]
+                commodity in self.inputs and 
+                commodity not in self.consumed_commodities
             ):
                 self.set_specific_consumed_commodities(commodity, 0)
             if (
-                commodity in [*self.outputs.keys()] and 
-                commodity not in [*self.produced_commodities.keys()]
+                commodity in self.outputs and 
+                commodity not in self.produced_commodities
             ):
                 self.set_specific_produced_commodities(commodity, 0)
 
@@ -397,6 +420,15 @@ class ConversionComponent(BaseComponent):
                 f"consumed_commodities={self.consumed_commodities!r}, "
                 f"produced_commodities={self.produced_commodities!r})")
 
+    def clone(self):
+        clone = super().clone()
+        clone.inputs = dict(self.inputs)
+        clone.outputs = dict(self.outputs)
+        clone.commodities = list(self.commodities)
+        clone.consumed_commodities = dict(self.consumed_commodities)
+        clone.produced_commodities = dict(self.produced_commodities)
+        return clone
+
     def __copy__(self, name=None):
         if name is None:
             name = self.name
@@ -414,6 +446,8 @@ class ConversionComponent(BaseComponent):
 
 
 class StorageComponent(BaseComponent):
+    __slots__ = ("charging_efficiency", "discharging_efficiency", "ratio_capacity_p", "min_soc", 
+                 "max_soc", "stored_commodity", "charge_state", "charged_quantity", "discharged_quantity")
     
     def __init__(self, name, variable_om=0., charging_efficiency=1., discharging_efficiency=1., 
                  min_soc=0., max_soc=1., ratio_capacity_p=1., stored_commodity=None, 
@@ -464,6 +498,7 @@ class StorageComponent(BaseComponent):
             )
         }
         self.assert_specs_match_class()
+        self.clear_spec_cache()
     
     def apply_action_method(self, method, ptx_system, values):
         """Actually apply the values returned by the action method to this component."""
@@ -667,6 +702,8 @@ class StorageComponent(BaseComponent):
 
 
 class GenerationComponent(BaseComponent):
+    __slots__ = ("generated_commodity", "curtailment_possible", "potential_generation_quantity", 
+                 "generated_quantity", "curtailment")
     
     def __init__(self, name, variable_om=0., generated_commodity='Electricity', 
                  curtailment_possible=True, fixed_capacity=0.,
@@ -705,6 +742,7 @@ class GenerationComponent(BaseComponent):
             )
         }
         self.assert_specs_match_class()
+        self.clear_spec_cache()
 
     def apply_action_method(self, method, ptx_system, values):
         """Actually apply the values returned by the action method to this component."""
@@ -5,11 +5,30 @@ from rlptx.ptx.framework import PtxSystem
 
 class Element(ABC):
     """Base class for all classes (commodities, components) of the PtX system."""
+    __slots__ = ("observation_spec", "action_spec", "tracked_attributes", "_spec_cache", 
+                 "_tracked_attributes_split")
     
     def __init__(self):
         self.observation_spec = {}
         self.action_spec = {}
         self.tracked_attributes = {}
+        # filtered observation attributes and action methods by the id of the list they were filtered from
+        self._spec_cache = {}
+        # attributes to track split by register_tracked_attributes
+        self._tracked_attributes_split = None
+    
+    def clone(self):
+        """Return a copy of this element which shares all values with it except for the containers 
+        that are changed during an episode. This is much faster than deepcopying the element."""
+        clone = object.__new__(type(self))
+        clone.observation_spec = dict(self.observation_spec)
+        clone.action_spec = dict(self.action_spec)
+        clone.tracked_attributes = {
+            k: dict(v) if type(v) is dict else v for k, v in self.tracked_attributes.items()
+        }
+        clone._spec_cache = {}
+        clone._tracked_attributes_split = self._tracked_attributes_split
+        return clone
     
     @abstractmethod
     def update_spec(self) -> None:
@@ -21,83 +40,112 @@ class Element(ABC):
         """Apply the values returned by a specific action method to the element and the ptx system."""
         pass
     
+    def register_tracked_attributes(self, attributes):
+        """Split the attributes to track into plain attributes and dict attributes without their 
+        prefix once, so that tracking them on every step does not need any string operations."""
+        plain_attributes = [attribute for attribute in attributes if not attribute.startswith("[dict]")]
+        dict_attributes = [attribute[6:] for attribute in attributes if attribute.startswith("[dict]")]
+        self._tracked_attributes_split = (attributes, plain_attributes, dict_attributes)
+    
     def update_tracked_attributes(self, attributes):
         """Track class attributes in a dict and set their values to a tuple with the 
         current value and the difference between the current value and the last tracked 
         value or also to the current value if the attribute has not been tracked yet. 
         Format: {attribute: (current_value, difference_to_last_value)}."""
-        for attribute in attributes:
-            if attribute in self.tracked_attributes:
-                # track dictionary value changes in a sub-dict
-                if attribute.startswith("[dict]"):
-                    attribute = attribute[6:]
-                    for name, value in getattr(self, attribute).items():
-                        difference = value - self.tracked_attributes[attribute][name][0]
-                        self.tracked_attributes[attribute][name] = (value, difference) 
-                else:
-                    difference = getattr(self, attribute) - self.tracked_attributes[attribute][0]
-                    self.tracked_attributes[attribute] = (getattr(self, attribute), difference)
-            else: # start tracking new attribute with current value
-                if attribute.startswith("[dict]"):
-                    attribute = attribute[6:]
-                    self.tracked_attributes[attribute] = {
-                        k: (v, 0) for k, v in getattr(self, attribute).items()
-                    }
-                else:
-                    self.tracked_attributes[attribute] = (getattr(self, attribute), 0)
+        if self._tracked_attributes_split is None or self._tracked_attributes_split[0] is not attributes:
+            self.register_tracked_attributes(attributes)
+        _, plain_attributes, dict_attributes = self._tracked_attributes_split
+        tracked_attributes = self.tracked_attributes
+        for attribute in plain_attributes:
+            value = getattr(self, attribute)
+            last = tracked_attributes.get(attribute)
+            if last is None: # start tracking new attribute with current value
+                tracked_attributes[attribute] = (value, 0)
+            else:
+                tracked_attributes[attribute] = (value, value - last[0])
+        # track dictionary value changes in a sub-dict which is updated in place
+        for attribute in dict_attributes:
+            last_values = tracked_attributes.get(attribute)
+            if last_values is None:
+                tracked_attributes[attribute] = {k: (v, 0) for k, v in getattr(self, attribute).items()}
+            else:
+                for name, value in getattr(self, attribute).items():
+                    last = last_values.get(name)
+                    last_values[name] = (value, 0) if last is None else (value, value - last[0])
+    
+    def clear_spec_cache(self):
+        """Clear the cached results of filtering observation attributes and action methods. 
+        This has to be called whenever the specs or their enabled flags are changed."""
+        self._spec_cache = {}
+    
+    def _get_cached_spec_result(self, relevant, filter_method):
+        """Return the cached result of the filter method for the given list or compute it once. 
+        The list is stored along with the result so its id cannot be reused by another list."""
+        cached = self._spec_cache.get(id(relevant))
+        if cached is None or cached[0] is not relevant:
+            cached = (relevant, filter_method(relevant))
+            self._spec_cache[id(relevant)] = cached
+        return cached[1]
     
     def get_possible_observation_attributes(self, relevant_attributes):
         """Out of a given list return all strings whose corresponding attributes of the class 
-        specified in the observation spec are true or which are not included but exist in the class."""
+        specified in the observation spec are true or which are not included but exist in the class. 
+        The result is cached per list as the specs do not change after initialization."""
+        return self._get_cached_spec_result(relevant_attributes, self._filter_observation_attributes)
+    
+    def get_possible_action_methods(self, relevant_method_tuples):
+        """Out of a given list return all methods whose corresponding attributes of the class 
+        specified in the observation spec are true. The result is cached per list as the specs 
+        do not change after initialization."""
+        return self._get_cached_spec_result(relevant_method_tuples, self._filter_action_methods)
+    
+    # Enabled flags are either booleans or names of boolean attributes of the class, 
+    # the check for them is inlined in the loops below as these run for every element.
+    def _filter_observation_attributes(self, relevant_attributes):
+        if not self.observation_spec:
+            return [attribute_name for attribute_name in relevant_attributes 
+                    if hasattr(self, attribute_name.split("]")[-1])]
         possible_attributes = []
         for attribute_name in relevant_attributes:
             attribute = attribute_name.split("]")[-1] # remove prefixes
-            handled = False
-            for k, v in self.observation_spec.items():
-                if attribute == k:
-                    enabled_flag = v[0]
-                    if self._is_enabled(enabled_flag):
-                        possible_attributes.append(attribute_name)
-                    handled = True
-            if not handled and hasattr(self, attribute):
+            spec = self.observation_spec.get(attribute)
+            if spec is None:
+                if hasattr(self, attribute):
+                    possible_attributes.append(attribute_name)
+                continue
+            enabled_flag = spec[0]
+            if enabled_flag is True or (type(enabled_flag) is str and getattr(self, enabled_flag)):
                 possible_attributes.append(attribute_name)
         return possible_attributes
     
-    def get_possible_action_methods(self, relevant_method_tuples):
-        """Out of a given list return all methods whose corresponding attributes 
-        of the class specified in the observation spec are true."""
+    def _filter_action_methods(self, relevant_method_tuples):
         if self.action_spec == {}:
             return relevant_method_tuples
         possible_methods = []
         for method_tuple in relevant_method_tuples:
-            for k, v in self.action_spec.items():
-                if method_tuple[0] == k:
-                    enabled_flag = v[0]
-                    if self._is_enabled(enabled_flag):
-                        possible_methods.append(method_tuple)
+            spec = self.action_spec.get(method_tuple[0])
+            if spec is None:
+                continue
+            enabled_flag = spec[0]
+            if enabled_flag is True or (type(enabled_flag) is str and getattr(self, enabled_flag)):
+                possible_methods.append(method_tuple)
         return possible_methods
     
-    def _is_enabled(self, enabled_flag):
-        """Check if an attribute's or method's enabled flag is enabled."""
-        if (
-            isinstance(enabled_flag, bool) and enabled_flag 
-            or isinstance(enabled_flag, str) and getattr(self, enabled_flag) == True
-        ):
-            return True
-        return False
-    
     def assert_specs_match_class(self):
         """Assert that the attributes and methods specified in the 
-        observation and action specs actually exist in the class."""
+        observation and action specs actually exist in the class. The checks 
+        only consist of asserts, so they are skipped entirely when running with -O."""
+        if not __debug__:
+            return
         self._check_observation_spec_matches_class_attributes()
         self._check_action_spec_matches_class_methods_and_attributes()
     
     def _check_observation_spec_matches_class_attributes(self):
         for attr in self.observation_spec.keys():
-            assert attr in self.__dict__.keys(), f"Observation '{attr}' does not exist in class."
+            assert hasattr(self, attr), f"Observation '{attr}' does not exist in class."
         for attr in self.observation_spec.values():
             if isinstance(attr[0], str):
-                assert attr[0] in self.__dict__.keys(), \
+                assert hasattr(self, attr[0]), \
                     f"Observation enabled flag '{attr[0]}' does not exist in class."
             if len(attr) > 1: # if lower and upper bounds exist
                 if isinstance(attr[1], list): # handle value lists for dicts
@@ -111,7 +159,7 @@ class Element(ABC):
     def _check_action_spec_matches_class_methods_and_attributes(self):
         for attr in self.action_spec.values():
             if isinstance(attr[0], str):
-                assert attr[0] in self.__dict__.keys(), \
+                assert hasattr(self, attr[0]), \
                     f"Action enabled flag '{attr[0]}' does not exist in class."
             assert attr[1] <= attr[2], \
                 f"Action spec range of '{attr[0]}' is invalid, lower value must be smaller than upper value."
@@ -1,8 +1,8 @@
-import copy
-from copy import deepcopy
-
-
 class PtxSystem:
+    __slots__ = ("project_name", "starting_budget", "balance", "previous_balance", "current_step", 
+                 "weather_provider", "commodities", "components", "_components_by_type", 
+                 "_conversions_cache", "_components_by_commodity", "_weather_key", 
+                 "_weather_data", "_commodity_pool", "available_commodities_conversion_log")
     
     def __init__(self, project_name='', starting_budget=0, weather_provider=None, 
                  current_step=0, commodities=None, components=None):
@@ -24,6 +24,9 @@ class PtxSystem:
         self.current_step = current_step
         
         self.weather_provider = weather_provider
+        # weather data of the current step and the step and weather offset it was retrieved for
+        self._weather_key = None
+        self._weather_data = None
 
         if commodities is None:
             commodities = {}
@@ -31,6 +34,18 @@ class PtxSystem:
             components = {}
         self.commodities = commodities
         self.components = components
+        # Components partitioned by their type in the order of the components dict. The partitions 
+        # are kept up to date when components are added or removed, so that the getters of the 
+        # components of a type do not need to filter all components on every call.
+        self._components_by_type = {"conversion": [], "storage": [], "generator": []}
+        for component in self.components.values():
+            self._components_by_type.setdefault(component.component_type, []).append(component)
+        # conversion tuples and ratios computed by get_all_conversions
+        self._conversions_cache = None
+        # names of the conversion components using each commodity computed by get_components_by_commodity
+        self._components_by_commodity = None
+        # commodities released by copies of this system which are reused by its next copies
+        self._commodity_pool = []
         # log commodities' available quantity before and after conversion as well as after sell/charge/emit
         self.available_commodities_conversion_log = ({}, {}, {})
         if self.commodities is not None:
@@ -47,9 +62,9 @@ class PtxSystem:
         """Go to the next step and return the change in balance since the last step."""
         self.current_step += 1
         self.update_all_tracked_attributes(category_attributes)
-        old_balance = self.previous_balance
+        balance_difference = self.balance - self.previous_balance
         self.previous_balance = self.balance
-        return self.balance - old_balance
+        return balance_difference
     
     def update_all_tracked_attributes(self, category_attributes):
         """Set all elements' to be tracked attributes to the difference between the current value 
@@ -65,7 +80,13 @@ class PtxSystem:
             storage.update_tracked_attributes(category_attributes["storage"]) 
     
     def get_current_weather_coefficient(self, source_name=None):
-        weather_data = self.weather_provider.get_weather_of_tick(self.current_step)
+        """Return the weather data of the current step or only the value of the given source. 
+        The data is retrieved once per step and offset of the weather provider and then reused."""
+        weather_key = (self.current_step, self.weather_provider.offset)
+        if weather_key != self._weather_key:
+            self._weather_data = self.weather_provider.get_weather_of_tick(self.current_step)
+            self._weather_key = weather_key
+        weather_data = self._weather_data
         if source_name is None:
             return weather_data
         else:
@@ -79,6 +100,14 @@ class PtxSystem:
         for commodity in self.get_all_commodities():
             commodity.available_quantity = 0
     
+    def release_commodities(self):
+        """Return all commodities to the commodity pool shared with the system this one was copied 
+        from when this system is not used anymore. The released commodities are reused by the next 
+        copy, so neither this system nor any of its commodities must be used afterwards."""
+        for commodity in self.get_all_commodities():
+            type(commodity).release(commodity, self._commodity_pool)
+        self.commodities = {}
+    
     def _set_commodity_observation_spec_based_on_components(self, commodity):
         """Set produced quantity to observable only if a component produces this commodity etc."""
         for component in self.components.values():
@@ -98,6 +127,7 @@ class PtxSystem:
                 observable = True if commodity.name == component.generated_commodity else False
                 commodity.observation_spec["generated_quantity"] = (observable,)
                 commodity.observation_spec["total_generation_costs"] = (observable,)
+        commodity.clear_spec_cache()
     
     def get_component_variable_om_parameters(self):
         variable_om = {}
@@ -177,17 +207,21 @@ class PtxSystem:
         return fixed_capacities_dict
 
     def get_all_technical_component_parameters(self):
-        variable_om_dict = self.get_component_variable_om_parameters()
-        minimal_power_dict = self.get_component_minimal_power_parameters()
-        maximal_power_dict = self.get_component_maximal_power_parameters()
-        ramp_up_dict = self.get_component_ramp_up_parameters()
-        ramp_down_dict = self.get_component_ramp_down_parameters()
-        charging_efficiency_dict = self.get_storage_component_charging_efficiency()
-        discharging_efficiency_dict = self.get_storage_component_discharging_efficiency()
-        minimal_soc_dict = self.get_storage_component_minimal_soc()
-        maximal_soc_dict = self.get_storage_component_maximal_soc()
-        ratio_capacity_power_dict = self.get_storage_component_ratio_capacity_power()
-        fixed_capacity_dict = self.get_fixed_capacities()
+        # build all dicts directly from the cached component lists instead of using the single getters
+        components = self.components.values()
+        conversions = self._components_by_type["conversion"]
+        storages = self._components_by_type["storage"]
+        variable_om_dict = {c.name: c.variable_om for c in components}
+        minimal_power_dict = {c.name: c.min_p for c in conversions}
+        maximal_power_dict = {c.name: c.max_p for c in conversions}
+        ramp_up_dict = {c.name: c.ramp_up for c in conversions}
+        ramp_down_dict = {c.name: c.ramp_down for c in conversions}
+        charging_efficiency_dict = {s.name: s.charging_efficiency for s in storages}
+        discharging_efficiency_dict = {s.name: s.discharging_efficiency for s in storages}
+        minimal_soc_dict = {s.name: s.min_soc for s in storages}
+        maximal_soc_dict = {s.name: s.max_soc for s in storages}
+        ratio_capacity_power_dict = {s.name: s.ratio_capacity_p for s in storages}
+        fixed_capacity_dict = {c.name: c.fixed_capacity for c in components}
 
         return (variable_om_dict, minimal_power_dict, maximal_power_dict, ramp_up_dict, 
                 ramp_down_dict, charging_efficiency_dict, discharging_efficiency_dict, 
@@ -200,7 +234,7 @@ class PtxSystem:
         purchasable_commodities = []
         saleable_commodities = []
 
-        for commodity in self.commodities:
+        for commodity in self.commodities.values():
             commodity_name = commodity.name
             commodities.append(commodity_name)
             if commodity.available:
@@ -212,137 +246,108 @@ class PtxSystem:
             if commodity.saleable:
                 saleable_commodities.append(commodity_name)
 
-        generated_commodities = []
-        for generator in self.get_generator_components_objects():
-            if generator.generated_commodity not in generated_commodities:
-                generated_commodities.append(generator.generated_commodity)
-
-        all_inputs = []
-        all_outputs = []
-        for component in self.get_conversion_components_objects():
-            inputs = component.inputs
-            outputs = component.outputs
-            for i in inputs:
-                if i not in all_inputs:
-                    all_inputs.append(i)
-            for o in outputs:
-                if o not in all_outputs:
-                    all_outputs.append(o)
+        # unique values in the order of their first occurrence
+        generated_commodities = list(dict.fromkeys(
+            generator.generated_commodity for generator in self.get_generator_components_objects()
+        ))
+        conversions = self.get_conversion_components_objects()
+        all_inputs = list(dict.fromkeys(i for component in conversions for i in component.inputs))
+        all_outputs = list(dict.fromkeys(o for component in conversions for o in component.outputs))
 
         return (commodities, available_commodities, emittable_commodities, purchasable_commodities, 
                 saleable_commodities, generated_commodities, all_inputs, all_outputs)
 
     def get_main_input_to_input_conversions(self):
         # main input to other inputs
-        input_tuples = []
-        main_input_to_input_conversion_tuples = []
-        main_input_to_input_conversion_tuples_dict = {}
-        for component_object in self.get_conversion_components_objects():
-            component_name = component_object.name
-            inputs = component_object.inputs
-            main_input = component_object.main_input
-            for current_input in [*inputs.keys()]:
-                input_tuples.append((component_name, current_input))
-                if current_input != main_input:
-                    main_input_to_input_conversion_tuples.append(
-                        (component_name, main_input, current_input)
-                    )
-                    main_input_to_input_conversion_tuples_dict.update(
-                        {(component_name, main_input, current_input): 
-                            float(inputs[current_input]) / float(inputs[main_input])}
-                    )
+        input_tuples, main_input_to_input_conversion_tuples, main_input_to_input_conversion_tuples_dict, \
+            _, _, _ = self.get_all_conversions()
         return (input_tuples, main_input_to_input_conversion_tuples, 
                 main_input_to_input_conversion_tuples_dict)
 
     def get_main_input_to_output_conversions(self):
+        _, _, _, output_tuples, main_input_to_output_conversion_tuples, \
+            main_input_to_output_conversion_tuples_dict = self.get_all_conversions()
+        return (output_tuples, main_input_to_output_conversion_tuples, 
+                main_input_to_output_conversion_tuples_dict)
+
+    def get_all_conversions(self):
+        """Return the conversion tuples and ratios of all conversion components. They are computed 
+        in a single pass and cached until the components change, see invalidate_component_caches()."""
+        if self._conversions_cache is None:
+            self._conversions_cache = self._compute_all_conversions()
+        return self._conversions_cache
+    
+    def invalidate_component_caches(self):
+        """Clear the cached conversions and components by commodity. This has to be called after the inputs, 
+        outputs or main input of a component were changed outside of this class."""
+        self._conversions_cache = None
+        self._components_by_commodity = None
+    
+    def _compute_all_conversions(self):
+        input_tuples = []
+        main_input_to_input_conversion_tuples = []
+        main_input_to_input_conversion_tuples_dict = {}
         output_tuples = []
         main_input_to_output_conversion_tuples = []
         main_input_to_output_conversion_tuples_dict = {}
-        for component_object in self.get_conversion_components_objects():
+        for component_object in self._components_by_type["conversion"]:
             component_name = component_object.name
             inputs = component_object.inputs
             outputs = component_object.outputs
             main_input = component_object.main_input
-            for current_output in [*outputs.keys()]:
-                main_input_to_output_conversion_tuples.append(
-                    (component_name, main_input, current_output)
-                )
-                main_input_to_output_conversion_tuples_dict.update(
-                    {(component_name, main_input, current_output): 
-                        float(outputs[current_output]) / float(inputs[main_input])}
-                )
+            main_input_ratio = float(inputs[main_input])
+            for current_input, ratio in inputs.items():
+                input_tuples.append((component_name, current_input))
+                if current_input != main_input:
+                    conversion_tuple = (component_name, main_input, current_input)
+                    main_input_to_input_conversion_tuples.append(conversion_tuple)
+                    main_input_to_input_conversion_tuples_dict[conversion_tuple] = float(ratio) / main_input_ratio
+            for current_output, ratio in outputs.items():
+                conversion_tuple = (component_name, main_input, current_output)
+                main_input_to_output_conversion_tuples.append(conversion_tuple)
+                main_input_to_output_conversion_tuples_dict[conversion_tuple] = float(ratio) / main_input_ratio
                 output_tuples.append((component_name, current_output))
-        return (output_tuples, main_input_to_output_conversion_tuples, 
-                main_input_to_output_conversion_tuples_dict)
-
-    def get_all_conversions(self):
-        input_tuples, main_input_to_input_conversion_tuples, main_input_to_input_conversion_tuples_dict \
-            = self.get_main_input_to_input_conversions()
-        output_tuples, input_to_output_conversion_tuples, input_to_output_conversion_tuples_dict \
-            = self.get_main_input_to_output_conversions()
         return (input_tuples, main_input_to_input_conversion_tuples, 
                 main_input_to_input_conversion_tuples_dict, output_tuples, 
-                input_to_output_conversion_tuples, input_to_output_conversion_tuples_dict)
+                main_input_to_output_conversion_tuples, main_input_to_output_conversion_tuples_dict)
 
     def get_conversion_components_names(self):
-        conversion_components_names = []
-        for c in self.get_all_component_names():
-            if self.components[c].component_type == 'conversion':
-                conversion_components_names.append(self.components[c].name)
-        return conversion_components_names
+        return [component.name for component in self._components_by_type["conversion"]]
 
     def get_conversion_components_objects(self):
-        conversion_components_objects = []
-        for c in self.get_all_component_names():
-            if self.components[c].component_type == 'conversion':
-                conversion_components_objects.append(self.components[c])
-        return conversion_components_objects
+        """Return the cached list of conversion components, it must not be modified."""
+        return self._components_by_type["conversion"]
 
     def get_storage_components_names(self):
-        storage_components_names = []
-        all_components = self.get_all_component_names()
-        for c in all_components:
-            if self.components[c].component_type == 'storage':
-                storage_components_names.append(self.components[c].name)
-        return storage_components_names
+        return [component.name for component in self._components_by_type["storage"]]
 
     def get_storage_components_objects(self):
-        storage_components_objects = []
-        all_components = self.get_all_component_names()
-        for c in all_components:
-            if self.components[c].component_type == 'storage':
-                storage_components_objects.append(self.components[c])
-        return storage_components_objects
+        """Return the cached list of storage components, it must not be modified."""
+        return self._components_by_type["storage"]
 
     def get_generator_components_names(self):
-        generator_components_names = []
-        all_components = self.get_all_component_names()
-        for c in all_components:
-            if self.components[c].component_type == 'generator':
-                generator_components_names.append(self.components[c].name)
-        return generator_components_names
+        return [component.name for component in self._components_by_type["generator"]]
 
     def get_generator_components_objects(self):
-        generator_components_objects = []
-        all_components = self.get_all_component_names()
-        for c in all_components:
-            if self.components[c].component_type == 'generator':
-                generator_components_objects.append(self.components[c])
-        return generator_components_objects
+        """Return the cached list of generator components, it must not be modified."""
+        return self._components_by_type["generator"]
 
     def adjust_commodity(self, name, commodity_object):
-        components = self.get_component_by_commodity(name)
+        components = self.get_components_by_commodity(name)
         for c in components:
+            commodities = self.components[c].commodities
+            commodities[commodities.index(name)] = commodity_object.name
+
             inputs = self.components[c].inputs
-            inputs[commodity_object.name] = inputs.pop(name)
-            self.components[c].inputs = inputs
+            if name in inputs:
+                inputs[commodity_object.name] = inputs.pop(name)
 
             if name == self.components[c].main_input:
                 self.components[c].main_input = commodity_object.name
 
             outputs = self.components[c].outputs
-            outputs[commodity_object.name] = outputs.pop(name)
-            self.components[c].outputs = outputs
+            if name in outputs:
+                outputs[commodity_object.name] = outputs.pop(name)
 
             if name == self.components[c].main_output:
                 self.components[c].main_output = commodity_object.name
@@ -353,27 +358,35 @@ class PtxSystem:
 
         for s in self.get_storage_components_objects():
             if s.name == name:
-                new_storage = deepcopy(s)
-                new_storage.name = commodity_object.name
+                # rename the storage itself instead of a copy of it, names of components are unique
                 self.remove_component_entirely(name)
-                self.add_component(commodity_object.name, new_storage)
+                s.name = commodity_object.name
+                if s.stored_commodity == name:
+                    s.stored_commodity = commodity_object.name
+                self.add_component(commodity_object.name, s)
+                break
 
+        self.invalidate_component_caches()
         self.add_commodity(commodity_object.name, commodity_object)
 
     def add_component(self, name, component):
+        if name in self.components:
+            self.remove_component_entirely(name)
         self.components.update({name: component})
+        self._components_by_type.setdefault(component.component_type, []).append(component)
+        self.invalidate_component_caches()
 
     def get_all_component_names(self):
-        return [*self.components.keys()]
+        """Return a view of the component names, use list() on it if a list is needed."""
+        return self.components.keys()
 
     def get_all_components(self):
-        components = []
-        for c in self.get_all_component_names():
-            components.append(self.components[c])
-        return components
+        return list(self.components.values())
 
     def remove_component_entirely(self, name):
-        self.components.pop(name)
+        component = self.components.pop(name)
+        self._components_by_type[component.component_type].remove(component)
+        self.invalidate_component_caches()
 
     def add_commodity(self, name, commodity):
         self.commodities.update({name: commodity})
@@ -385,28 +398,29 @@ class PtxSystem:
         self.commodities.pop(name)
 
     def get_all_commodity_names(self):
-        return [*self.commodities.keys()]
+        """Return a view of the commodity names, use list() on it if a list is needed."""
+        return self.commodities.keys()
     
     def get_all_commodities(self):
-        commodities = []
-        for c in self.get_all_commodity_names():
-            commodities.append(self.commodities[c])
-        return commodities
+        return list(self.commodities.values())
 
     def get_commodities_by_component(self, component):
         return self.components[component].commodities
 
     def get_components_by_commodity(self, commodity):
-        components = []
-        for c in self.components:
-            if self.components[c].component_type == 'conversion':
-                if commodity in self.get_commodity_by_component(c):
-                    components.append(c)
-        return components
+        """Return the names of the conversion components which use the commodity as input or output. 
+        The names of all commodities are indexed once and cached until the components change, 
+        see invalidate_component_caches(). The returned list must not be modified."""
+        if self._components_by_commodity is None:
+            self._components_by_commodity = {}
+            for component in self._components_by_type["conversion"]:
+                for commodity_name in component.commodities:
+                    self._components_by_commodity.setdefault(commodity_name, []).append(component.name)
+        return self._components_by_commodity.get(commodity, [])
 
     def __str__(self):
         if self.weather_provider is not None:
-            weather_data = self.weather_provider.get_weather_of_tick(self.current_step).to_dict()
+            weather_data = self.get_current_weather_coefficient()._asdict()
             weather = "{" + ", ".join([
                                         f'{k}={v:{".4f" if isinstance(v, float) else ""}}' 
                                         for k, v in weather_data.items()
@@ -428,11 +442,12 @@ class PtxSystem:
                 f"commodities={self.commodities!r}, components={self.components!r})")
 
     def __copy__(self):
-        # deepcopy mutable objects
-        components = copy.deepcopy(self.components)
-        commodities = copy.deepcopy(self.commodities)
+        # clone elements instead of deepcopying them, only their changing containers are copied
+        components = {name: component.clone() for name, component in self.components.items()}
+        commodities = {name: commodity.clone(self._commodity_pool) for name, commodity in self.commodities.items()}
         ptx_system = PtxSystem(project_name=self.project_name, starting_budget=self.starting_budget, 
                                weather_provider=self.weather_provider, current_step=self.current_step, 
                                commodities=commodities, components=components)
         ptx_system.set_initial_balance(self.balance)
+        ptx_system._commodity_pool = self._commodity_pool
         return ptx_system
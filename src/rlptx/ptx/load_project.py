@@ -19,85 +19,74 @@ def init_project(ptx_system, case_data):
     ptx_system.project_name = case_data['project_name']
 
     # Allocate components and parameters
-    for component in [*case_data['component'].keys()]:
-        name = case_data['component'][component]['name']
-        variable_om = case_data['component'][component]['variable_om']
-        fixed_capacity = case_data['component'][component]['fixed_capacity']
-
-        if case_data['component'][component]['component_type'] == 'conversion':
-            min_p = case_data['component'][component]['min_p']
-            max_p = case_data['component'][component]['max_p']
-
-            ramp_up = case_data['component'][component]['ramp_up']
-            ramp_down = case_data['component'][component]['ramp_down']
-
-            conversion_component = ConversionComponent(name=name, variable_om=variable_om,
-                                                       min_p=min_p, max_p=max_p, 
-                                                       ramp_up=ramp_up, ramp_down=ramp_down, 
-                                                       fixed_capacity=fixed_capacity)
-            ptx_system.add_component(name, conversion_component)
-
-        elif case_data['component'][component]['component_type'] == 'storage':
-            min_soc = case_data['component'][component]['min_soc']
-            max_soc = case_data['component'][component]['max_soc']
-            charging_efficiency = case_data['component'][component]['charging_efficiency']
-            discharging_efficiency = case_data['component'][component]['discharging_efficiency']
-            ratio_capacity_p = case_data['component'][component]['ratio_capacity_p']
-            stored_commodity = case_data['component'][component]['stored_commodity']
-
-            storage_component = StorageComponent(name=name, variable_om=variable_om, 
-                                                 charging_efficiency=charging_efficiency,
-                                                 discharging_efficiency=discharging_efficiency,
-                                                 min_soc=min_soc, max_soc=max_soc, 
-                                                 ratio_capacity_p=ratio_capacity_p,
-                                                 stored_commodity=stored_commodity,
-                                                 fixed_capacity=fixed_capacity)
-            ptx_system.add_component(name, storage_component)
-
-        elif case_data['component'][component]['component_type'] == 'generator':
-            generated_commodity = case_data['component'][component]['generated_commodity']
-            curtailment_possible = case_data['component'][component]['curtailment_possible']
-
-            generator = GenerationComponent(name=name, variable_om=variable_om,
-                                            generated_commodity=generated_commodity,
-                                            curtailment_possible=curtailment_possible,
-                                            fixed_capacity=fixed_capacity)
-            ptx_system.add_component(name, generator)
+    for component_data in case_data['component'].values():
+        create_component = COMPONENT_CONSTRUCTORS.get(component_data['component_type'])
+        if create_component is not None:
+            ptx_system.add_component(component_data['name'], create_component(component_data))
 
     # Conversions
-    for c in [*case_data['conversions'].keys()]:
+    for c, conversion_data in case_data['conversions'].items():
         component = ptx_system.components[c]
-        for i in [*case_data['conversions'][c]['input'].keys()]:
-            component.add_input(i, case_data['conversions'][c]['input'][i])
+        for i, ratio in conversion_data['input'].items():
+            component.add_input(i, ratio)
 
-        for o in [*case_data['conversions'][c]['output'].keys()]:
-            component.add_output(o, case_data['conversions'][c]['output'][o])
+        for o, ratio in conversion_data['output'].items():
+            component.add_output(o, ratio)
 
-        component.main_input = case_data['conversions'][c]['main_input']
-        component.main_output = case_data['conversions'][c]['main_output']
+        component.main_input = conversion_data['main_input']
+        component.main_output = conversion_data['main_output']
         component._normalize_commodity_ratios_based_on_main_input()
         component.update_spec()
+    ptx_system.invalidate_component_caches()
 
     # Commodities
-    for c in [*case_data['commodity'].keys()]:
-        name = case_data['commodity'][c]['name']
-        commodity_unit = case_data['commodity'][c]['unit']
-
-        available = case_data['commodity'][c]['available']
-        emittable = case_data['commodity'][c]['emitted']
-        purchasable = case_data['commodity'][c]['purchasable']
-        saleable = case_data['commodity'][c]['saleable']
+    for commodity_data in case_data['commodity'].values():
+        name = commodity_data['name']
+        commodity_unit = commodity_data['unit']
+
+        available = commodity_data['available']
+        emittable = commodity_data['emitted']
+        purchasable = commodity_data['purchasable']
+        saleable = commodity_data['saleable']
         
         # Purchasable commodities
-        purchase_price = case_data['commodity'][c]['purchase_price']
+        purchase_price = commodity_data['purchase_price']
 
         # Saleable commodities
-        selling_price = case_data['commodity'][c]['selling_price']
+        selling_price = commodity_data['selling_price']
 
-        commodity = Commodity(name=name, commodity_unit=commodity_unit, 
-                              available=available, purchasable=purchasable, 
-                              saleable=saleable, emittable=emittable,
-                              purchase_price=purchase_price, sale_price=selling_price)
+        commodity = Commodity.from_config(name=name, commodity_unit=commodity_unit, 
+                                          available=available, purchasable=purchasable, 
+                                          saleable=saleable, emittable=emittable,
+                                          purchase_price=purchase_price, sale_price=selling_price)
         ptx_system.add_commodity(name, commodity)
     
     return ptx_system
+
+def _create_conversion_component(component_data):
+    return ConversionComponent(name=component_data['name'], variable_om=component_data['variable_om'],
+                               min_p=component_data['min_p'], max_p=component_data['max_p'], 
+                               ramp_up=component_data['ramp_up'], ramp_down=component_data['ramp_down'], 
+                               fixed_capacity=component_data['fixed_capacity'])
+
+def _create_storage_component(component_data):
+    return StorageComponent(name=component_data['name'], variable_om=component_data['variable_om'], 
+                            charging_efficiency=component_data['charging_efficiency'],
+                            discharging_efficiency=component_data['discharging_efficiency'],
+                            min_soc=component_data['min_soc'], max_soc=component_data['max_soc'], 
+                            ratio_capacity_p=component_data['ratio_capacity_p'],
+                            stored_commodity=component_data['stored_commodity'],
+                            fixed_capacity=component_data['fixed_capacity'])
+
+def _create_generation_component(component_data):
+    return GenerationComponent(name=component_data['name'], variable_om=component_data['variable_om'],
+                               generated_commodity=component_data['generated_commodity'],
+                               curtailment_possible=component_data['curtailment_possible'],
+                               fixed_capacity=component_data['fixed_capacity'])
+
+# functions creating the components of each component type from their config data
+COMPONENT_CONSTRUCTORS = {
+    'conversion': _create_conversion_component,
+    'storage': _create_storage_component,
+    'generator': _create_generation_component
+}
@@ -13,3 +13,13 @@ torch.serialization.add_safe_globals([
 
 # make gpu accessible for network training in actor and critic if available
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def to_device(data, device=DEVICE):
+    """Return the data as a float32 tensor on the given device. Tensors which already 
+    have this dtype and device are returned as they are instead of being copied. Numpy arrays 
+    are wrapped without copying them first, so float32 arrays on the cpu are not copied at all 
+    and other arrays are only copied once while converting their dtype or device."""
+    if type(data) is numpy.ndarray and data.flags.writeable:
+        return torch.from_numpy(data).to(device=device, dtype=torch.float32, non_blocking=True)
+    return torch.as_tensor(data, dtype=torch.float32, device=device)
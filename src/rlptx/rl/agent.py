@@ -1,12 +1,11 @@
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from typing import Any
 import numpy as np
 import torch
 import torch.nn.functional as F
 
-from rlptx.rl.network import Actor, Critic
-from rlptx.rl import DEVICE
+from rlptx.rl.network import Actor, Critic, create_adam_optimizer
+from rlptx.rl import DEVICE, to_device
 
 
 # hyperparameters taken from sac paper
@@ -16,6 +15,10 @@ POLYAK_COEFFICIENT = 0.995 # (/tau) for polyak averaging in target
 INITIAL_ENTROPY_COEFFICIENT = 1 # (/alpha) for calculating actor loss
 ENTROPY_LEARNING_RATE = 3e-4
 
+STATS_NAMES = ("loss_critic", "loss_actor", "log_prob_actor", "loss_entropy", "log_entropy_regularization")
+STATS_TRANSFER_INTERVAL = 1000 # amount of updates after which their stats are transferred at the latest
+CUDA_GRAPH_WARMUP_UPDATES = 3 # amount of updates run eagerly on a side stream before capturing the graph
+
 
 class Agent(ABC):
     """Abstract base class for all agents."""
@@ -39,7 +42,8 @@ class SacAgent(Agent):
     
     def __init__(self, observation_size, action_size, action_bounds, discount=DISCOUNT_FACTOR, 
                  polyak=POLYAK_COEFFICIENT, initial_entropy=INITIAL_ENTROPY_COEFFICIENT, 
-                 entropy_learning_rate=ENTROPY_LEARNING_RATE, actor=None, critic=None, seed=None, device=DEVICE):
+                 entropy_learning_rate=ENTROPY_LEARNING_RATE, actor=None, critic=None, seed=None, device=DEVICE, 
+                 compile_networks=False, use_cuda_graph=False, grad_accum_steps=1):
         self.seed = seed
         self.observation_size = observation_size
         self.action_size = action_size
@@ -60,83 +64,194 @@ class SacAgent(Agent):
             np.log(initial_entropy), requires_grad=True, dtype=torch.float32, device=device
         )
         self.target_entropy = torch.tensor(-action_size, dtype=torch.float32, device=device)
-        self.entropy_optimizer = torch.optim.Adam(
-            [self.log_entropy_regularization], lr=entropy_learning_rate, weight_decay=0
+        self._target_entropy_value = float(-action_size) # python float to avoid adding a tensor in every update
+        self.entropy_optimizer = create_adam_optimizer(
+            [self.log_entropy_regularization], entropy_learning_rate
         )
         # Separate target critic to improve stability.
         # Its networks are slowly updated to match the critic networks.
-        self.target_critic = deepcopy(self.critic)
-        for parameter in self.target_critic.parameters():
-            parameter.requires_grad = False
+        self.target_critic = self.critic.clone()
+        self.target_critic.requires_grad_(False)
         self.polyak = polyak # coefficient for soft target network updates
-        self.stats_log = {"loss_critic": [], "loss_actor": [], "log_prob_actor": [], 
-                          "loss_entropy": [], "log_entropy_regularization": []}
+        self._one_minus_polyak = 1.0 - polyak
+        self._critic_parameters = list(self.critic.parameters())
+        self._target_critic_parameters = list(self.target_critic.parameters())
+        # Optionally compile the networks' forward passes so that their many small operations are 
+        # fused into fewer kernels. The modules are compiled in place, so their state dicts do not 
+        # change. On gpus, cuda graphs are used as well to reduce the kernel launch overhead. 
+        # The kernels are specialized to the fixed shapes of the networks' inputs, new input 
+        # shapes like a different batch size lead to a recompilation instead of dynamic kernels.
+        if compile_networks:
+            mode = "reduce-overhead" if torch.device(device).type == "cuda" else None
+            for network in (self.actor, self.critic, self.target_critic):
+                network.compile(mode=mode, dynamic=False)
+        # Optionally capture a whole update in a cuda graph after a few warmup updates and only replay 
+        # it afterwards, which launches all of its kernels at once. This requires the shapes of the 
+        # updates' inputs to stay the same and the optimizers to keep their state on the device.
+        self.use_cuda_graph = use_cuda_graph
+        if use_cuda_graph:
+            assert torch.device(device).type == "cuda", "Cuda graphs can only be used on gpus."
+            for optimizer in (self.actor.optimizer, self.critic.optimizer, self.entropy_optimizer):
+                for parameter_group in optimizer.param_groups:
+                    parameter_group["capturable"] = True
+        self._update_graph = None
+        self._graph_inputs = None
+        self._graph_stats = None
+        self._warmup_updates = 0
+        # Optionally accumulate the gradients of several consecutive updates and only step the 
+        # optimizers and update the target critic on the last of them. The losses are scaled so 
+        # that the applied gradients are the mean of the accumulated ones. All accumulated losses 
+        # are computed with the same parameters, so the critic is stepped together with the actor.
+        assert grad_accum_steps >= 1, "The amount of gradient accumulation steps must be at least 1."
+        assert not (use_cuda_graph and grad_accum_steps > 1), \
+            "Gradient accumulation cannot be used together with cuda graphs."
+        self.grad_accum_steps = grad_accum_steps
+        self._accumulated_updates = 0
+        # The stats of each update stay on the device until the stats log is accessed, so that 
+        # updating does not need to wait for the device to transfer them after every update.
+        self._stats_log = {name: [] for name in STATS_NAMES}
+        self._pending_stats = []
+    
+    @property
+    def stats_log(self):
+        """Dict with a list of the values of each stat in STATS_NAMES for all updates."""
+        self._transfer_pending_stats()
+        return self._stats_log
+    
+    def _transfer_pending_stats(self):
+        """Transfer the stats of all pending updates from the device at once."""
+        if not self._pending_stats:
+            return
+        pending_stats = torch.stack(self._pending_stats).cpu().tolist()
+        self._pending_stats = []
+        for name, values in zip(STATS_NAMES, zip(*pending_stats)):
+            self._stats_log[name].extend(values)
     
     def act(self, observation, evaluation_mode=False):
         """Return an action determined by the policy of the agent for the given observation. Calling 
         this method does not update the agent's networks or change its state. If in evaluation 
         mode, the action is deterministic instead of being sampled from a normal distribution."""
-        with torch.no_grad():
-            action, _ = self.actor(observation, evaluation_mode) # log_probs never needed here
+        # The observation is converted before calling the actor, so that a compiled actor 
+        # does not trace the conversion of numpy arrays, which fails in inference mode.
+        observation = to_device(observation, self.actor.device)
+        # the returned action is never used for training, so autograd tracking can be skipped entirely
+        with torch.inference_mode():
+            if evaluation_mode:
+                action = self.actor.forward_deterministic(observation)
+            else:
+                action, _ = self.actor(observation) # log_probs never needed here
         return action.cpu().numpy() # return numpy array instead of tensor
     
     def update(self, observation, action, reward, next_observation, terminated):
         """Update the agent's networks by calculating their losses and applying gradient descent. 
         This is also done for the entropy coefficient. The target critic network is updated 
         separately using polyak averaging instead of gradient descent."""
+        if self.use_cuda_graph:
+            stats = self._update_with_cuda_graph(observation, action, reward, next_observation, terminated)
+        else:
+            stats = self._update(observation, action, reward, next_observation, terminated)
+        self._pending_stats.append(stats)
+        if len(self._pending_stats) >= STATS_TRANSFER_INTERVAL:
+            self._transfer_pending_stats()
+    
+    def _update_with_cuda_graph(self, observation, action, reward, next_observation, terminated):
+        """Run the update eagerly on a side stream during warmup, then capture it in a cuda graph 
+        with static input tensors. Afterwards, the inputs are copied into the static tensors and 
+        the graph is replayed. Returns a copy of the stats of the update."""
+        inputs = (observation, action, reward, next_observation, terminated)
+        if self._update_graph is None and self._warmup_updates < CUDA_GRAPH_WARMUP_UPDATES:
+            # warm up on a side stream so that lazily created state is not created during capture
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                stats = self._update(*inputs)
+            torch.cuda.current_stream().wait_stream(stream)
+            self._warmup_updates += 1
+            return stats
+        if self._update_graph is None:
+            self._graph_inputs = tuple(torch.empty_like(tensor) for tensor in inputs)
+            self._update_graph = torch.cuda.CUDAGraph()
+            # capturing does not run the update, it is run by replaying the graph below
+            with torch.cuda.graph(self._update_graph):
+                self._graph_stats = self._update(*self._graph_inputs)
+        for graph_input, tensor in zip(self._graph_inputs, inputs):
+            graph_input.copy_(tensor, non_blocking=True)
+        self._update_graph.replay()
+        return self._graph_stats.clone()
+    
+    def _update(self, observation, action, reward, next_observation, terminated):
+        """Run a single update as described in update() and return its stats stacked 
+        in the order of STATS_NAMES. Stacking them does not wait for the device. With 
+        gradient accumulation, the gradients are only applied every grad_accum_steps updates."""
         action = torch.squeeze(action)
         observation = torch.squeeze(observation)
         next_observation = torch.squeeze(next_observation)
         
+        # entropy_regularization is converted from log value to value once for both losses
+        entropy_regularization = torch.exp(self.log_entropy_regularization.detach())
+        
+        self._accumulated_updates += 1
+        start_accumulation = self._accumulated_updates == 1
+        apply_gradients = self._accumulated_updates == self.grad_accum_steps
+        
         # Perform pytorch gradient descent steps for critic.
-        self.critic.optimizer.zero_grad()
+        if start_accumulation:
+            self.critic.optimizer.zero_grad()
         loss_critic = self._calculate_critic_loss(
-            observation, action, next_observation, reward, terminated
+            observation, action, next_observation, reward, terminated, entropy_regularization
         )
-        loss_critic.backward()
-        self.critic.optimizer.step()
-        self.stats_log["loss_critic"].append(loss_critic.item())
+        self._scale_loss(loss_critic).backward()
+        if apply_gradients and self.grad_accum_steps == 1:
+            self.critic.optimizer.step()
         
-        # Perform pytorch gradient descent steps for actor.
-        # Freeze critic parameters during this as they were already updated.
-        for parameter in self.critic.parameters():
+        # Perform pytorch gradient descent steps for actor and entropy coefficient.
+        # Freeze critic parameters during this as they were already updated. This also 
+        # saves computing their gradients in the backward pass, which are not needed.
+        # Both losses are backpropagated in a single call as the entropy loss only 
+        # depends on the detached log probability of the actor.
+        for parameter in self._critic_parameters:
             parameter.requires_grad = False
-        self.actor.optimizer.zero_grad()
-        loss_actor, log_prob_actor = self._calculate_actor_loss(observation)
-        loss_actor.backward()
-        self.actor.optimizer.step()
-        for parameter in self.critic.parameters():
+        if start_accumulation:
+            self.actor.optimizer.zero_grad()
+            self.entropy_optimizer.zero_grad()
+        loss_actor, log_prob_actor = self._calculate_actor_loss(observation, entropy_regularization)
+        loss_entropy = self._calculate_entropy_loss(log_prob_actor)
+        torch.autograd.backward([self._scale_loss(loss_actor), self._scale_loss(loss_entropy)])
+        for parameter in self._critic_parameters:
             parameter.requires_grad = True
-        self.stats_log["loss_actor"].append(loss_actor.item())
-        self.stats_log["log_prob_actor"].append(log_prob_actor.item())
+        
+        if not apply_gradients:
+            return self._stack_stats(loss_critic, loss_actor, log_prob_actor, loss_entropy)
+        if self.grad_accum_steps > 1:
+            self.critic.optimizer.step()
+        self.actor.optimizer.step()
+        self.entropy_optimizer.step()
+        self._accumulated_updates = 0
         
         # Soft update target critic networks gradually using polyak averaging.
         # This enables not directly copying the critic networks into the target 
         # networks, but to more slowly update the target network by taking a 
         # weighted average of the critic and target networks with the polyak 
         # coefficient controlling the weighting; this increases stability.
-        for target_param, critic_param in zip(
-            self.target_critic.parameters(), self.critic.parameters()
-        ):
-            target_param.data.copy_(
-                self.polyak * target_param.data + (1 - self.polyak) * critic_param.data
-            )
+        # The parameters are updated in place with fused operations over all of them at once.
+        with torch.no_grad():
+            torch._foreach_mul_(self._target_critic_parameters, self.polyak)
+            torch._foreach_add_(self._target_critic_parameters, self._critic_parameters, 
+                                alpha=self._one_minus_polyak)
         
-        # Perform gradient descent steps for entropy coefficient. This is a more simple 
-        # process as the entropy coefficient is a single value and not a network. 
-        # The entropy coef loss is determined by the entropy of the action minus the 
-        # (always negative) heuristic target entropy value (action dimension). 
-        # This trains the coefficient to converge to the target entropy value.
-        self.entropy_optimizer.zero_grad()
-        loss_entropy = (-self.log_entropy_regularization 
-                        * (log_prob_actor.detach() + self.target_entropy))
-        loss_entropy.backward()
-        self.entropy_optimizer.step()
-        self.stats_log["loss_entropy"].append(loss_entropy.item())
-        self.stats_log["log_entropy_regularization"].append(self.log_entropy_regularization.item())
+        return self._stack_stats(loss_critic, loss_actor, log_prob_actor, loss_entropy)
+    
+    def _stack_stats(self, loss_critic, loss_actor, log_prob_actor, loss_entropy):
+        """Stack the stats of an update in the order of STATS_NAMES."""
+        stats = (loss_critic, loss_actor, log_prob_actor, loss_entropy, self.log_entropy_regularization)
+        return torch.stack([stat.detach().reshape(()) for stat in stats])
+    
+    def _scale_loss(self, loss):
+        """Scale the loss so that the accumulated gradients are averaged over the accumulation steps."""
+        return loss if self.grad_accum_steps == 1 else loss / self.grad_accum_steps
     
     def _calculate_critic_loss(self, observation, action, next_observation, 
-                               reward, terminated):
+                               reward, terminated, entropy_regularization):
         """Critic loss is determined by how much the quality value of the current 
         action in the current state differs from the received reward for the current 
         action and the discounted expected quality of the next action in the next 
@@ -144,24 +259,24 @@ class SacAgent(Agent):
         trains the critic to predict the quality of the current and next action while 
         rewarding more unlikely next actions, encouraging exploration."""
         q1, q2 = self.critic(observation, action)
+        # not inference mode, as the target q is saved by the loss for the backward pass
         with torch.no_grad():
             next_action, next_log_probability = self.actor(next_observation)
             next_q1, next_q2 = self.target_critic(next_observation, next_action)
             next_q = torch.min(next_q1, next_q2)
-            # entropy_regularization is converted from log value to value
-            entropy_regularization = torch.exp(self.log_entropy_regularization.detach())
             # Calculate bellman backup of bellman equation: this target value is 
             # the reward of the current state plus the value of the next state.
             # The value of the next state is 0 if the iteration is terminated.
-            target_q = (reward + self.discount * (1 - terminated) 
-                        * (next_q - entropy_regularization * next_log_probability))
-        target_q = torch.squeeze(target_q, 1)
+            # Fused form of: reward + discount * (next_q - entropy_reg * next_log_prob)
+            next_value = torch.addcmul(next_q, entropy_regularization, next_log_probability, value=-1)
+            target_q = torch.where(terminated.to(torch.bool), reward, 
+                                   torch.add(reward, next_value, alpha=self.discount))
         loss_q1 = F.mse_loss(q1, target_q) # mean squared error between q and target q
         loss_q2 = F.mse_loss(q2, target_q)
         loss = loss_q1 + loss_q2
         return loss
     
-    def _calculate_actor_loss(self, observation):
+    def _calculate_actor_loss(self, observation, entropy_regularization):
         """Actor loss is determined by the entropy of the action (i.e. how 
         unlikely it is) and the quality value of the action. This trains 
         the actor to choose actions with high quality that are also more 
@@ -171,8 +286,14 @@ class SacAgent(Agent):
         # This improves the q value because it counteracts overestimation.
         q1, q2 = self.critic(observation, action)
         q = torch.min(q1, q2)
-        # entropy_regularization is converted from log value to value
-        entropy_regularization = torch.exp(self.log_entropy_regularization.detach())
         loss = entropy_regularization * log_probability - q
         return loss, log_probability
+    
+    def _calculate_entropy_loss(self, log_probability):
+        """Entropy coefficient loss is determined by the entropy of the action minus the 
+        (always negative) heuristic target entropy value (action dimension). This is a more 
+        simple process as the entropy coefficient is a single value and not a network. 
+        This trains the coefficient to converge to the target entropy value."""
+        loss = -self.log_entropy_regularization * (log_probability.detach() + self._target_entropy_value)
+        return loss
     
\ No newline at end of file
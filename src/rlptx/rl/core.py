@@ -1,4 +1,3 @@
-from copy import deepcopy
 import numpy as np
 import torch
 
@@ -9,6 +8,8 @@ from rlptx.rl import DEVICE
 
 
 MODEL_SAVE_PATH = "models/"
+REPLAY_BUFFER_DIR_SUFFIX = "_replay_buffer/" # appended to an agent's filename for its replay buffer's arrays
+REPLAY_BUFFER_ARRAYS = ("observations", "actions", "rewards", "next_observations", "terminateds")
 
 
 class ReplayBuffer:
@@ -17,65 +18,229 @@ class ReplayBuffer:
     The replay buffer has a fixed capacity and overwrites the oldest transition if the buffer is full. 
     Transition data consists of observations, actions, rewards, next observations, and terminateds."""
     
-    def __init__(self, capacity, observations_shape, actions_shape, seed=None, device=DEVICE):
+    def __init__(self, capacity, observations_shape, actions_shape, seed=None, device=DEVICE, 
+                 store_on_device=False, observation_dtype=np.float32):
         """Create a replay buffer with the given capacity of transitions that can be stored. 
-        A seed to control the random sampling can be specified."""
+        A seed to control the random sampling can be specified. If store_on_device is true, the 
+        transitions are stored in tensors on the device instead of numpy arrays in host memory, 
+        so that sampling does not need to copy them to the device. The capacity is then limited 
+        by the memory of the device. The observations can be stored with a smaller dtype like 
+        np.float16 to reduce the memory and the amount of data moved when sampling them, as 
+        they make up most of a transition. They are converted to float32 when sampled."""
         self.device = device
-        self.observations = np.empty((capacity, observations_shape), dtype=np.float32)
-        self.actions = np.empty((capacity, actions_shape), dtype=np.float32)
-        self.rewards = np.empty((capacity, 1), dtype=np.float32)
-        self.next_observations = np.empty((capacity, observations_shape), dtype=np.float32)
-        self.terminateds = np.empty((capacity, 1), dtype=bool)
+        self.store_on_device = store_on_device
+        self.observation_dtype = np.dtype(observation_dtype)
+        self._transition_groups = None
+        if store_on_device:
+            observation_dtype = torch.from_numpy(np.empty(0, dtype=self.observation_dtype)).dtype
+            self.observations = torch.empty((capacity, observations_shape), dtype=observation_dtype, device=device)
+            self.actions = torch.empty((capacity, actions_shape), dtype=torch.float32, device=device)
+            self.rewards = torch.empty(capacity, dtype=torch.float32, device=device)
+            self.next_observations = torch.empty((capacity, observations_shape), dtype=observation_dtype, device=device)
+            self.terminateds = torch.empty(capacity, dtype=torch.bool, device=device)
+        else:
+            # All parts of a transition are stored next to each other in a single row of one array, 
+            # so that sampling gathers all of them at once. The arrays of the separate parts are 
+            # column views into it, with the terminateds being stored as float32 zeros and ones. 
+            # The rewards and terminateds are single columns, so their views are one-dimensional. 
+            # Observations with a smaller dtype are stored in a second array of that dtype, 
+            # so that the other parts of the transitions keep their precision.
+            widths = {"observations": observations_shape, "actions": actions_shape, "rewards": None, 
+                      "next_observations": observations_shape, "terminateds": None}
+            if self.observation_dtype == np.float32:
+                groups = ((np.float32, REPLAY_BUFFER_ARRAYS),)
+            else:
+                groups = ((self.observation_dtype, ("observations", "next_observations")), 
+                          (np.float32, ("actions", "rewards", "terminateds")))
+            self._transition_groups = tuple(
+                _create_transition_group(capacity, dtype, {name: widths[name] for name in names}) 
+                for dtype, names in groups
+            )
+            for transitions, columns in self._transition_groups:
+                for name, column in columns.items():
+                    setattr(self, name, transitions[:, column])
+            # group and column of each part in the order in which they are sampled
+            self._sample_columns = [
+                next((group, columns[name]) for group, (_, columns) in enumerate(self._transition_groups) 
+                     if name in columns) 
+                for name in REPLAY_BUFFER_ARRAYS
+            ]
         self.capacity = capacity
         self.index = 0
         self.full = False
         self.rng = np.random.default_rng(seed)
+        # indices of transitions stored on the device are sampled on the device as well
+        self.generator = None
+        if store_on_device:
+            self.generator = torch.Generator(device=device)
+            if seed is not None:
+                self.generator.manual_seed(seed)
+            else:
+                self.generator.seed()
+        # On gpus, sampled transitions are gathered into page-locked staging tensors from 
+        # which they are copied to the gpu asynchronously, see _sample_to_gpu.
+        self._pin_memory = not store_on_device and torch.device(device).type == "cuda"
+        self._staging = None
+        self._staging_copied = None # event recorded after the last copy from the staging tensors
     
     def add(self, observation, action, reward, next_observation, terminated):
         """Add a new transition from an environment step to the replay buffer. 
         If the buffer is full, the oldest transition is overwritten."""
-        self.observations[self.index] = observation
-        self.actions[self.index] = action
-        self.rewards[self.index] = reward
-        self.next_observations[self.index] = next_observation
-        self.terminateds[self.index] = terminated
+        if self.store_on_device:
+            transition = (observation, action, reward, next_observation, terminated)
+            for storage, value in zip(self._get_storages(), transition):
+                storage[self.index] = torch.as_tensor(value, dtype=storage.dtype)
+        else:
+            self.observations[self.index] = observation
+            self.actions[self.index] = action
+            self.rewards[self.index] = reward
+            self.next_observations[self.index] = next_observation
+            self.terminateds[self.index] = terminated
         self.index += 1
         if self.index >= self.capacity:
             self.index = 0
             self.full = True
     
+    def add_batch(self, observations, actions, rewards, next_observations, terminateds):
+        """Add a batch of transitions, e.g. from multiple environments, to the replay buffer at once. 
+        The transitions are written as at most two contiguous slices, wrapping around at the end 
+        of the buffer. Rewards and terminateds can be given with one value per transition."""
+        amount = len(observations)
+        assert amount <= self.capacity, "Batch of transitions must not be larger than the replay buffer."
+        # amount of transitions that fit until the end of the buffer, the rest is written to its start
+        until_end = min(amount, self.capacity - self.index)
+        batch = (observations, actions, rewards, next_observations, terminateds)
+        for storage, values in zip(self._get_storages(), batch):
+            if self.store_on_device:
+                values = torch.as_tensor(values, dtype=storage.dtype).reshape(amount, *storage.shape[1:])
+            else:
+                values = np.asarray(values).reshape(amount, *storage.shape[1:])
+            storage[self.index:self.index + until_end] = values[:until_end]
+            storage[:amount - until_end] = values[until_end:]
+        self.index += amount
+        if self.index >= self.capacity:
+            self.index -= self.capacity
+            self.full = True
+    
     def sample(self, batch_size=1):
-        """Sample a (batch of) transition(s) randomly from the replay buffer."""
+        """Sample a (batch of) transition(s) randomly from the replay buffer. The terminateds 
+        are returned as bool tensors and all other parts of the transitions as float32 tensors. 
+        The rewards and terminateds have one value per transition, i.e. their shape is (batch_size,)."""
         length = self.capacity if self.full else self.index
+        if self.store_on_device:
+            indices = torch.randint(0, length, (batch_size,), generator=self.generator, device=self.device)
+            return self._to_sample_dtypes([storage.index_select(0, indices) for storage in self._get_storages()])
         indices = self.rng.integers(0, length, size=batch_size)
+        merged = self._is_merged()
+        if self._pin_memory:
+            return self._sample_to_gpu(indices, merged)
+        if merged:
+            return self._split_transitions([
+                torch.from_numpy(transitions[indices]).to(self.device) for transitions, _ in self._transition_groups
+            ])
         return (
             torch.as_tensor(self.observations[indices], dtype=torch.float32, device=self.device),
             torch.as_tensor(self.actions[indices], dtype=torch.float32, device=self.device),
             torch.as_tensor(self.rewards[indices], dtype=torch.float32, device=self.device),
             torch.as_tensor(self.next_observations[indices], dtype=torch.float32, device=self.device),
-            torch.as_tensor(self.terminateds[indices], dtype=torch.float32, device=self.device)
+            torch.as_tensor(self.terminateds[indices], dtype=torch.bool, device=self.device)
         )
     
+    def _sample_to_gpu(self, indices, merged):
+        """Gather the transitions at the indices into the staging tensors and copy them to the gpu 
+        without blocking. The copies are queued on the current stream, so the networks using the 
+        batch wait for them, while the cpu can already continue with the next environment step. 
+        If the transitions are merged, each of their arrays is gathered and copied as a single tensor."""
+        arrays = [transitions for transitions, _ in self._transition_groups] if merged else self._get_storages()
+        if self._staging is None or len(self._staging) != len(arrays) or len(self._staging[0]) != len(indices):
+            self._staging = tuple(
+                torch.empty((len(indices), *array.shape[1:]), dtype=torch.from_numpy(array[:0]).dtype, 
+                            pin_memory=True) 
+                for array in arrays
+            )
+        elif self._staging_copied is not None:
+            # the last batch must be copied before its staging tensors are overwritten
+            self._staging_copied.synchronize()
+        batch = []
+        for array, staging in zip(arrays, self._staging):
+            # The indices are always in range. With the default mode "raise", numpy would 
+            # gather into a temporary array first and copy it to out, as out could be partially 
+            # written before an index error. Clipping writes into the staging tensor directly.
+            np.take(array, indices, axis=0, out=staging.numpy(), mode="clip")
+            batch.append(staging.to(self.device, non_blocking=True))
+        self._staging_copied = torch.cuda.Event()
+        self._staging_copied.record()
+        return self._split_transitions(batch) if merged else self._to_sample_dtypes(batch)
+    
+    def _is_merged(self):
+        """Whether the arrays of the buffer are still the views into its merged transitions, 
+        which is not the case after they were replaced, e.g. when loading a saved buffer."""
+        if self._transition_groups is None:
+            return False
+        return all(getattr(self, name).base is transitions 
+                   for transitions, columns in self._transition_groups for name in columns)
+    
+    def _split_transitions(self, batches):
+        """Split the batches of the merged transition arrays into the views of their parts."""
+        return self._to_sample_dtypes([batches[group][:, column] for group, column in self._sample_columns])
+    
+    def _to_sample_dtypes(self, batch):
+        """Convert the sampled observations to float32 and the terminateds to bool if necessary."""
+        observations, actions, rewards, next_observations, terminateds = batch
+        if observations.dtype != torch.float32:
+            observations = observations.to(torch.float32)
+            next_observations = next_observations.to(torch.float32)
+        if terminateds.dtype != torch.bool:
+            terminateds = terminateds.to(torch.bool)
+        return observations, actions, rewards, next_observations, terminateds
+    
+    def _get_storages(self):
+        return (self.observations, self.actions, self.rewards, self.next_observations, self.terminateds)
+    
     def get_data(self):
+        """Return the data of the buffer with the transitions as numpy arrays."""
+        observations, actions, rewards, next_observations, terminateds = (
+            storage.cpu().numpy() if self.store_on_device else storage for storage in self._get_storages()
+        )
+        if terminateds.dtype != bool: # merged terminateds are stored as float32
+            terminateds = terminateds.astype(bool)
         return {
-            "observations": self.observations,
-            "actions": self.actions,
-            "rewards": self.rewards,
-            "next_observations": self.next_observations,
-            "terminateds": self.terminateds,
+            "observations": observations,
+            "actions": actions,
+            "rewards": rewards,
+            "next_observations": next_observations,
+            "terminateds": terminateds,
             "capacity": self.capacity,
             "index": self.index,
             "full": self.full
         }
 
 
+def _create_transition_group(capacity, dtype, widths):
+    """Create an array whose rows contain the given parts of transitions next to each other and 
+    return it with the column of each part. Parts without a width are a single column index."""
+    columns = {}
+    start = 0
+    for name, width in widths.items():
+        columns[name] = start if width is None else slice(start, start + width)
+        start += 1 if width is None else width
+    return np.empty((capacity, start), dtype=dtype), columns
+
+
 def save_sac_agent(agent, replay_buffer, filename, path=MODEL_SAVE_PATH):
-    """Save a SAC agent to a file including all its hyperparameters and its networks' parameters."""
+    """Save a SAC agent to a file including all its hyperparameters and its networks' parameters. 
+    The arrays of the replay buffer are saved as separate .npy files in a directory next to the file, 
+    so that they are written and loaded without pickling and can be memory-mapped."""
     actor = agent.actor
     critic = agent.critic
     target_critic = agent.target_critic
     mkdir(path)
     file_path = PROJECT_DIR / (path + filename + ".tar")
+    replay_buffer_data = replay_buffer.get_data()
+    replay_buffer_path = path + filename + REPLAY_BUFFER_DIR_SUFFIX
+    mkdir(replay_buffer_path)
+    for name in REPLAY_BUFFER_ARRAYS:
+        np.save(PROJECT_DIR / replay_buffer_path / f"{name}.npy", replay_buffer_data.pop(name))
     torch.save({
         "actor": actor.state_dict(), 
         "critic": critic.state_dict(), 
@@ -92,15 +257,17 @@ def save_sac_agent(agent, replay_buffer, filename, path=MODEL_SAVE_PATH):
         "critic_hidden_sizes": critic.hidden_sizes,
         "observation_size": agent.observation_size, 
         "action_size": agent.action_size,
-        "replay_buffer": replay_buffer.get_data(),
+        "replay_buffer": replay_buffer_data,
         "seed": agent.seed
     }, file_path)
     return file_path
 
 def load_sac_agent(filename, path=MODEL_SAVE_PATH, seed=None):
     """Load a SAC agent with replay buffer from a file. Returns the agent with 
-    all its networks and hyperparameters set and the buffer with its data."""
-    model = torch.load(PROJECT_DIR / (path + filename + ".tar"), weights_only=True)
+    all its networks and hyperparameters set and the buffer with its data. The buffer's arrays 
+    are memory-mapped copy-on-write, so they are only read when accessed and the buffer can be 
+    changed without changing the saved files."""
+    model = torch.load(PROJECT_DIR / (path + filename + ".tar"), weights_only=True, mmap=True)
     seed = model["seed"] if seed is None else seed
     set_seed(seed)
     actor = Actor(model["observation_size"], model["action_size"], model["action_bounds"], 
@@ -109,15 +276,25 @@ def load_sac_agent(filename, path=MODEL_SAVE_PATH, seed=None):
     critic = Critic(model["observation_size"], model["action_size"], hidden_sizes=model["critic_hidden_sizes"], 
                     learning_rate=model["critic_learning_rate"])
     critic.load_state_dict(model["critic"])
-    target_critic = deepcopy(critic)
-    target_critic.load_state_dict(model["target_critic"])
     agent = SacAgent(model["observation_size"], model["action_size"], model["action_bounds"], 
                      discount=model["discount"], polyak=model["polyak"], initial_entropy=model["initial_entropy"], 
                      entropy_learning_rate=model["entropy_learning_rate"], actor=actor, critic=critic, seed=seed)
-    agent.target_critic = target_critic
+    agent.target_critic.load_state_dict(model["target_critic"])
     with torch.no_grad(): # set value of tensor; no_grad necessary to avoid error
         agent.log_entropy_regularization.fill_(model["log_entropy_regularization"])
-    replay_buffer_data = model["replay_buffer"]
+    replay_buffer_data = dict(model["replay_buffer"])
+    if "observations" in replay_buffer_data:
+        # the arrays of older files are stored in the file itself, as numpy arrays or tensors
+        for name in REPLAY_BUFFER_ARRAYS:
+            array = replay_buffer_data[name]
+            replay_buffer_data[name] = array.numpy() if isinstance(array, torch.Tensor) else array
+    else:
+        replay_buffer_path = PROJECT_DIR / (path + filename + REPLAY_BUFFER_DIR_SUFFIX)
+        for name in REPLAY_BUFFER_ARRAYS:
+            replay_buffer_data[name] = np.load(replay_buffer_path / f"{name}.npy", mmap_mode="c")
+    # rewards and terminateds of older files have a trailing dimension of size one
+    for name in ("rewards", "terminateds"):
+        replay_buffer_data[name] = replay_buffer_data[name].reshape(-1)
     replay_buffer = ReplayBuffer(replay_buffer_data["capacity"], model["observation_size"], model["action_size"], seed=seed)
     replay_buffer.observations = replay_buffer_data["observations"]
     replay_buffer.actions = replay_buffer_data["actions"]
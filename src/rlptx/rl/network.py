@@ -1,15 +1,18 @@
-import numpy as np
+import math
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from rlptx.rl import DEVICE
+from rlptx.rl import DEVICE, to_device
 
 # hyperparameters taken from sac paper (as well as activation function and optimizer)
 HIDDEN_SIZES = (512, 512, 512, 512)
 LEARNING_RATE = 3e-4
 STANDARD_DEVIATION_BOUNDS = (-20, 2) # values from spinningup implementation
 
+LOG_2 = math.log(2) # used in the tanh squashing correction of the log probabilities
+HALF_LOG_2_PI = 0.5 * math.log(2 * math.pi) # constant term of the normal distribution's log density
+
 
 class Actor(nn.Module):
     """Probabilistic actor network representing the policy function of the agent. 
@@ -27,23 +30,26 @@ class Actor(nn.Module):
         self.policy_net = create_mlp([observation_size, *hidden_sizes], output_activation=nn.ReLU(), device=device)
         self.mean_layer = nn.Linear(hidden_sizes[-1], action_size, device=device)
         self.standard_deviation_layer = nn.Linear(hidden_sizes[-1], action_size, device=device)
-        self.optimizer = torch.optim.Adam(self.parameters(), lr=learning_rate, weight_decay=0)
+        # The scales of positive and negative actions are kept on the device as non-persistent buffers, 
+        # so they move with the module but are not part of its state dict.
+        self.register_buffer("positive_action_scales", torch.as_tensor(
+            action_bounds[1], dtype=torch.float32, device=device), persistent=False)
+        self.register_buffer("negative_action_scales", -torch.as_tensor(
+            action_bounds[0], dtype=torch.float32, device=device), persistent=False)
+        self.optimizer = create_adam_optimizer(self.parameters(), learning_rate)
     
     def forward(self, observation, evaluation_mode=False):
         """The observation is fed into the network which generates an action. The network outputs mean 
         and standard deviation values which are used to create normal distributions from which actions 
         are sampled. Returns the actions and their total log probability (entropy value). If in evaluation 
         mode, the actions are not sampled but instead only the deterministic mean values are returned."""
-        observation = (torch.tensor(observation, dtype=torch.float32, device=self.device) 
-                       if not isinstance(observation, torch.Tensor) else observation)
-        policy_output = self.policy_net(observation)
-        
-        means = self.mean_layer(policy_output)
         # In evaluation mode, only the deterministic mean values are returned 
         # as actions instead of sampling actions from a normal distribution.
         if evaluation_mode:
-            squashed_actions = self._squash_scale_actions(means)
-            return squashed_actions, None # no log probability needed in evaluation mode
+            return self.forward_deterministic(observation), None # no log probability needed
+        observation = to_device(observation, self.device)
+        policy_output = self.policy_net(observation)
+        means = self.mean_layer(policy_output)
         
         # The network outputs the log of the standard deviation, meaning the actual 
         # standard deviation needs to be calculated. The log values have the advantage 
@@ -53,7 +59,6 @@ class Actor(nn.Module):
         log_standard_deviations = self.standard_deviation_layer(policy_output)
         log_standard_deviations = torch.clamp(log_standard_deviations, *STANDARD_DEVIATION_BOUNDS)
         standard_deviations = torch.exp(log_standard_deviations)
-        probability_distributions = torch.distributions.Normal(means, standard_deviations)
         
         # Apply reparameterization trick to address problem of backpropagation through 
         # a node with a source of randomness (sampling from distribution). 
@@ -61,29 +66,34 @@ class Actor(nn.Module):
         # takes the trainable parameters as inputs and is trained during backpropagation 
         # and another consisting of a static standard normal distribution as the source of 
         # randomness which can therefore be ignored during backpropagation.
-        actions = probability_distributions.rsample()
+        # The normal distributions are sampled directly instead of creating distribution objects.
+        noise = torch.randn_like(means)
+        actions = torch.addcmul(means, standard_deviations, noise)
         squashed_actions = self._squash_scale_actions(actions)
         
         # Compute log probabilities, rescaling probabilities from [0, 1] to [-inf, 0].
         # They are added and used as the entropy term in the loss function with a lower 
         # value meaning higher entropy as the action tuple is less likely to occur.
         # Lower values of higher entropy are rewarded because they encourage exploration.
-        log_probability = probability_distributions.log_prob(actions).sum(dim=-1)
+        # The standardized actions are the sampled noise, so the normal log density is computed from it.
+        log_probability = (-0.5 * noise.square() - log_standard_deviations - HALF_LOG_2_PI).sum(dim=-1)
         # Correction for tanh squashing, using alternative formula from spinningup.
         # Original formula: log_probability -= torch.log(1 - squashed_action.pow(2) + noise)
-        log_probability -= (2*(np.log(2) - actions - F.softplus(-2*actions))).sum(dim=-1)
+        log_probability -= tanh_squash_correction(actions)
         return squashed_actions, log_probability
     
+    def forward_deterministic(self, observation):
+        """Return the deterministic actions for the observation which are the squashed and scaled 
+        mean values. The standard deviation head and the normal distributions are not computed."""
+        observation = to_device(observation, self.device)
+        means = self.mean_layer(self.policy_net(observation))
+        return self._squash_scale_actions(means)
+    
     def _squash_scale_actions(self, actions):
-        """Squash actions to [-1, 1] with tanh and scale them to their environment bounds."""
-        bounds = []
-        for i in range(len(actions)):
-            if actions[i] > 0: # positive upper bound action
-                bounds.append(self.action_bounds[1][i])
-            else: # negative lower bound action
-                bounds.append(-self.action_bounds[0][i])
-        return (torch.tanh(actions) 
-                * torch.tensor(bounds, dtype=torch.float32, device=self.device))
+        """Squash actions to [-1, 1] with tanh and scale them to their environment bounds. Positive 
+        actions are scaled by the upper bounds and negative ones by the negated lower bounds."""
+        scales = torch.where(actions > 0, self.positive_action_scales, self.negative_action_scales)
+        return torch.tanh(actions) * scales
 
 
 class Critic(nn.Module):
@@ -95,31 +105,57 @@ class Critic(nn.Module):
     def __init__(self, observation_size, action_size, hidden_sizes=HIDDEN_SIZES, 
                  learning_rate=LEARNING_RATE, device=DEVICE):
         super().__init__()
+        self.observation_size = observation_size
+        self.action_size = action_size
         self.hidden_sizes = hidden_sizes
         self.learning_rate = learning_rate
         self.device = device
         # fixed output layer of size one for returning a single q value
         self.q1_net = create_mlp([observation_size + action_size, *hidden_sizes, 1], device=device)
         self.q2_net = create_mlp([observation_size + action_size, *hidden_sizes, 1], device=device)
-        self.optimizer = torch.optim.Adam(self.parameters(), lr=learning_rate, weight_decay=0)
+        self.optimizer = create_adam_optimizer(self.parameters(), learning_rate)
     
     def forward(self, observation, action):
         """Combines observation and action into a single input tensor which 
         is fed into the two networks. Returns output values of both networks."""
-        inputs = torch.cat([observation, action], dim=-1).to(dtype=torch.float32, device=self.device)
+        inputs = to_device(torch.cat([observation, action], dim=-1), self.device)
         q1 = self.q1_net(inputs)
         q2 = self.q2_net(inputs)
         return q1, q2
+    
+    def clone(self):
+        """Return a new critic with the same hyperparameters and parameter values as this one. 
+        Only the parameters are copied, not the optimizer state or anything else of the module. 
+        The random number generators are restored after initializing the new critic's parameters, 
+        so that creating the clone does not change the random numbers drawn afterwards."""
+        with torch.random.fork_rng():
+            clone = Critic(self.observation_size, self.action_size, hidden_sizes=self.hidden_sizes, 
+                           learning_rate=self.learning_rate, device=self.device)
+        clone.load_state_dict(self.state_dict())
+        return clone
+
+
+def tanh_squash_correction(actions):
+    """Return the summed log probability correction for squashing the actions with tanh. 
+    The constant is a python float so that it is broadcast without creating a tensor. When 
+    the actor is compiled, the elementwise operations are fused into a single kernel."""
+    return (2 * (LOG_2 - actions - F.softplus(-2 * actions))).sum(dim=-1)
 
+def create_adam_optimizer(parameters, learning_rate):
+    """Create an adam optimizer which updates all parameters with a single fused kernel 
+    instead of several kernels per parameter tensor."""
+    return torch.optim.Adam(parameters, lr=learning_rate, weight_decay=0, fused=True)
 
 def create_mlp(layer_sizes, activation=nn.ReLU(), output_activation=nn.Identity(), device=DEVICE):
-    """Create a multi-layer perceptron with the specified layer sizes and activation functions."""
+    """Create a multi-layer perceptron with the specified layer sizes and activation functions. 
+    An identity output activation is omitted, so that it does not add a module call to every 
+    forward pass. The indices of the linear layers and therefore the state dict stay the same."""
     layers = []
     for i in range(len(layer_sizes) - 1):
         layers.append(nn.Linear(layer_sizes[i], layer_sizes[i + 1]))
         if i < len(layer_sizes) - 2:
             layers.append(activation)
-        else:
+        elif not isinstance(output_activation, nn.Identity):
             layers.append(output_activation)
     model = nn.Sequential(*layers)
     return model.to(device)
@@ -1,6 +1,7 @@
 from tqdm import tqdm
 
 from rlptx.environment.environment import PtxEnvironment
+from rlptx.environment.vector import VectorEnvironment
 from rlptx.environment.weather import WeatherDataProvider
 from rlptx.rl.core import load_sac_agent
 from rlptx.ptx import load_project
@@ -9,7 +10,7 @@ from rlptx.util import set_seed
 
 
 def test_ptx_agent(agent, episodes=100, max_steps_per_episode=None, weather_forecast_days=1, 
-                   starting_budget=100, progress_bar=False, seed=None):
+                   starting_budget=100, progress_bar=False, seed=None, num_envs=1):
     """Test a trained SAC agent on the PtX environment.
     
     :param agent: [SacAgent, str] 
@@ -28,11 +29,15 @@ def test_ptx_agent(agent, episodes=100, max_steps_per_episode=None, weather_fore
         - Whether to show a progress bar for the steps of each episode.
     :param seed: [int] 
         - The seed to use for the random number generators of the used modules.
+    :param num_envs: [int] 
+        - The number of environments which run the test episodes in parallel. The agent determines 
+        the actions for all of them at once, which reduces the overhead per step.
     """
     disable_logger("main")
     disable_logger("status")
     disable_logger("reward")
     configure_logger("evaluation", console_level=Level.WARNING) # don't write normal logs to console
+    flush_deferred_logs() # write earlier logs before the output of the testing
     print("Starting testing...")
     set_seed(seed)
     ptx_system = load_project()
@@ -42,41 +47,57 @@ def test_ptx_agent(agent, episodes=100, max_steps_per_episode=None, weather_fore
         ptx_system, weather_data_provider, weather_forecast_days=weather_forecast_days, 
         max_steps_per_episode=max_steps_per_episode, seed=seed, evaluation_mode=True
     )
-    average_episode_revenue = _test_sac(episodes, env, agent, progress_bar, seed)
+    average_episode_revenue = _test_sac(episodes, env, agent, progress_bar, seed, num_envs)
     return average_episode_revenue, agent, env # for use in notebooks etc
 
-def test_ptx_agent_from_train(agent, env, current_episode, episodes=10, progress_bar=True, seed=None):
+def test_ptx_agent_from_train(agent, env, current_episode, episodes=10, progress_bar=True, seed=None, 
+                              num_envs=1):
     """Function to be used for testing after training in train.py."""
     configure_logger("evaluation", console_level=Level.WARNING) # don't write normal logs to console
     assert env.evaluation_mode == True, "Environment must be in evaluation mode."
     log(f"Tests after {current_episode} episodes:", "test")
-    average_episode_revenue = _test_sac(episodes, env, agent, progress_bar, seed)
+    average_episode_revenue = _test_sac(episodes, env, agent, progress_bar, seed, num_envs)
     print("Testing complete.")
     return average_episode_revenue
 
-def _test_sac(episodes, env, agent, use_progress_bar=True, seed=None):
-    """Execute the SAC testing loop. Returns the average episode revenue as the success metric."""
+def _test_sac(episodes, env, agent, use_progress_bar=True, seed=None, num_envs=1):
+    """Execute the SAC testing loop. Returns the average episode revenue as the success metric. 
+    The episodes are distributed over num_envs copies of the environment which are stepped together, 
+    so that the actions for all of them are determined with a single call of the agent."""
     log_mode = "deferred" if use_progress_bar else "default"
-    observation, info = env.initialize(seed=seed)
+    vector_env = VectorEnvironment.from_environment(env, min(num_envs, episodes), seed)
+    envs = vector_env.envs
+    observations, infos = vector_env.initialize(seed=seed)
     episode_revenues = []
     if use_progress_bar:
+        flush_deferred_logs() # write earlier logs before the progress bar
         progress_bar = tqdm(total=episodes, desc="Test Episodes", ncols=100)
-    for episode in range(episodes):
-        while not env.truncated and not env.terminated:
-            # Select an action based on the current observation. 
-            # Make the agent do this deterministically in evaluation mode.
-            action = agent.act(observation, evaluation_mode=True)
-            next_observation, reward, terminated, truncated, info = env.act(action, log_mode=log_mode)
-            observation = next_observation
-        episode_revenues.append(env.stats_log[-1]["Episode revenue"])
-        observation, info = env.reset()
-        if use_progress_bar:
+    started_episodes = len(envs)
+    active = list(range(len(envs))) # indices of the environments whose episodes are not finished yet
+    while active:
+        # Select actions based on the current observations of all active environments. 
+        # Make the agent do this deterministically in evaluation mode.
+        actions = agent.act(observations[active], evaluation_mode=True)
+        for i, action in zip(active, actions):
+            observations[i], reward, terminated, truncated, info = envs[i].act(action, log_mode=log_mode)
+        for i in list(active):
+            if not envs[i].truncated and not envs[i].terminated:
+                continue
+            episode_revenues.append(envs[i].stats_log[-1]["Episode revenue"])
+            if use_progress_bar:
                 progress_bar.update(1)
+            if started_episodes < episodes:
+                # only start another episode if it is still needed
+                observations[i], info = envs[i].reset()
+                started_episodes += 1
+            else:
+                active.remove(i)
     if use_progress_bar:
         progress_bar.close()
-        flush_deferred_logs() # only print logs after progress bar is finished
     average_episode_revenue = sum(episode_revenues) / len(episode_revenues)
     log(f"Average episode revenue: {average_episode_revenue:.4f}", "test")
+    # the logs are written after the progress bar is finished and before any following output
+    flush_deferred_logs()
     return average_episode_revenue
 
 
@@ -4,6 +4,7 @@ import numpy as np
 
 from rlptx.environment.environment import GymEnvironment, PtxEnvironment
 from rlptx.environment.weather import WeatherDataProvider
+from rlptx.environment.vector import create_vector_environment
 from rlptx.rl.agent import SacAgent
 from rlptx.rl.core import ReplayBuffer, save_sac_agent, load_sac_agent
 from rlptx.rl import DEVICE
@@ -18,21 +19,26 @@ REPLAY_BUFFER_SIZE = 10**5
 
 def train_gym_half_cheetah(episodes=100, warmup_steps=1000, update_interval=1, updates=1, max_steps_per_episode=None, 
                            test_interval=10, test_episodes=10, save_threshold=None, epoch_save_interval=None, 
-                           agent=None, replay_buffer=None, progress_bar=False, seed=None, device="cpu"):
+                           agent=None, replay_buffer=None, progress_bar=False, seed=None, device="cpu", 
+                           compile_networks=False, use_cuda_graph=False, grad_accum_steps=1, 
+                           store_on_device=False, observation_dtype=np.float32):
     """Train the SAC agent on the gym HalfCheetah-v5 environment for testing. Returns the trained agent."""
     disable_logger("main")
     device = DEVICE if device == "gpu" else "cpu" # default to cpu if no gpu available
+    flush_deferred_logs() # write earlier logs before the output of the training
     print(f"Training on device: {device}")
     set_seed(seed)
     env = GymEnvironment("HalfCheetah-v5", max_steps_per_episode=max_steps_per_episode)
     if agent is None:
         agent = SacAgent(
             env.observation_space_size, env.action_space_size, 
-            (env.action_space_spec["low"], env.action_space_spec["high"]), device=device, seed=seed
+            (env.action_space_spec["low"], env.action_space_spec["high"]), device=device, seed=seed, 
+            compile_networks=compile_networks, use_cuda_graph=use_cuda_graph, grad_accum_steps=grad_accum_steps
         )
     if replay_buffer is None:
         replay_buffer = ReplayBuffer(
-            REPLAY_BUFFER_SIZE, env.observation_space_size, env.action_space_size, device=device, seed=seed
+            REPLAY_BUFFER_SIZE, env.observation_space_size, env.action_space_size, device=device, seed=seed, 
+            store_on_device=store_on_device, observation_dtype=observation_dtype
         )
     _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, replay_buffer, test_interval, 
                test_episodes, save_threshold, epoch_save_interval, progress_bar, seed)
@@ -41,7 +47,9 @@ def train_gym_half_cheetah(episodes=100, warmup_steps=1000, update_interval=1, u
 def train_ptx_system(episodes=100, warmup_steps=1000, update_interval=1, updates=1, max_steps_per_episode=None, 
                      weather_forecast_days=1, test_interval=10000, test_episodes=10, 
                      save_threshold=1000, epoch_save_interval=None, agent=None, replay_buffer=None, 
-                     progress_bar=True, seed=None, device="cpu"):
+                     progress_bar=True, seed=None, device="cpu", num_envs=1, async_envs=False, 
+                     compile_networks=False, use_cuda_graph=False, grad_accum_steps=1, 
+                     store_on_device=False, observation_dtype=np.float32):
     """Train the SAC agent on the PtX environment. Returns the trained agent.
 
     :param episodes: [int] 
@@ -79,11 +87,29 @@ def train_ptx_system(episodes=100, warmup_steps=1000, update_interval=1, updates
         - The seed to use for the random number generators of the used modules.
     :param device: [str] 
         - The device to train the agent on, "cpu" or "gpu". The default is "cpu" as it tends to be faster.
+    :param num_envs: [int] 
+        - The number of environments which are stepped together during training. The agent determines the 
+        actions for all of them at once and their transitions are added to the replay buffer together. 
+        The warmup is done in a single environment.
+    :param async_envs: [bool] 
+        - Whether to run each of the environments in its own worker process, so that their steps are computed 
+        in parallel. This only pays off if a step takes longer than the communication with the workers.
+    :param compile_networks: [bool] 
+        - Whether to compile the networks of a newly created agent with torch.compile.
+    :param use_cuda_graph: [bool] 
+        - Whether a newly created agent captures its updates in a cuda graph. Only possible on gpus.
+    :param grad_accum_steps: [int] 
+        - The number of consecutive updates whose gradients a newly created agent accumulates before applying them.
+    :param store_on_device: [bool] 
+        - Whether a newly created replay buffer stores the transitions on the training device instead of in host memory.
+    :param observation_dtype: [np.dtype] 
+        - The dtype with which a newly created replay buffer stores the observations, e.g. np.float16 to halve their memory.
     """
     disable_logger("main")
     disable_logger("status")
     disable_logger("reward")
     device = DEVICE if device == "gpu" else "cpu" # default to cpu if no gpu available
+    flush_deferred_logs() # write earlier logs before the output of the training
     print(f"Training on device: {device}")
     set_seed(seed)
     ptx_system = load_project()
@@ -96,20 +122,23 @@ def train_ptx_system(episodes=100, warmup_steps=1000, update_interval=1, updates
     if agent is None:
         agent = SacAgent(
             env.observation_space_size, env.action_space_size, 
-            (env.action_space_spec["low"], env.action_space_spec["high"]), device=device, seed=seed
+            (env.action_space_spec["low"], env.action_space_spec["high"]), device=device, seed=seed, 
+            compile_networks=compile_networks, use_cuda_graph=use_cuda_graph, grad_accum_steps=grad_accum_steps
         )
     if replay_buffer is None:
         replay_buffer = ReplayBuffer(
-            REPLAY_BUFFER_SIZE, env.observation_space_size, env.action_space_size, device=device, seed=seed
+            REPLAY_BUFFER_SIZE, env.observation_space_size, env.action_space_size, device=device, seed=seed, 
+            store_on_device=store_on_device, observation_dtype=observation_dtype
         )
     _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, replay_buffer, test_interval, 
-               test_episodes, save_threshold, epoch_save_interval, progress_bar, seed)
+               test_episodes, save_threshold, epoch_save_interval, progress_bar, seed, num_envs, async_envs)
     return agent, replay_buffer, env # for use in notebooks etc
 
 def _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, replay_buffer, test_interval, 
-               test_episodes, save_threshold, epoch_save_interval, use_progress_bar=True, seed=None):
+               test_episodes, save_threshold, epoch_save_interval, use_progress_bar=True, seed=None, num_envs=1, 
+               async_envs=False):
     """Execute the main SAC training loop."""
-    log_mode = "deferred" if use_progress_bar else "default"
+    testenv = None
     if test_interval is not None:
         testenv = deepcopy(env)
         testenv.evaluation_mode = True
@@ -153,12 +182,48 @@ def _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, rep
     ### Training
     # Now use the agent to determine actions and save them to the replay buffer. 
     # The agent is trained every update_interval steps on data from the replay buffer.
+    if num_envs > 1:
+        vector_env = create_vector_environment(env, num_envs, seed, asynchronous=async_envs)
+        try:
+            successful_steps, non_failed_episodes, total_steps = _train_sac_vector_environment(
+                episodes, update_interval, updates, vector_env, agent, replay_buffer, testenv, test_interval, 
+                test_episodes, save_threshold, epoch_save_interval, total_steps, use_progress_bar, seed
+            )
+        finally:
+            vector_env.close()
+    else:
+        successful_steps, non_failed_episodes, total_steps = _train_sac_environment(
+            episodes, update_interval, updates, env, agent, replay_buffer, testenv, test_interval, 
+            test_episodes, save_threshold, epoch_save_interval, total_steps, use_progress_bar, seed
+        )
+    log(f"Training Review - Number of successful steps: {successful_steps}, Total number of steps: "
+        f"{total_steps}, Number of non-failed episodes: {non_failed_episodes}", "episode")
+    # Final testing after training
+    save_flag = False # determine whether the agent should be saved (based on performance)
+    if test_interval == -1:
+        average_episode_revenue = test_ptx_agent_from_train(
+            agent, testenv, episodes, test_episodes, use_progress_bar, seed
+        )
+        save_flag = save_threshold is not None and average_episode_revenue >= save_threshold
+    # Save the final agent
+    if epoch_save_interval == -1 or save_flag:
+            name_appendix = "_TOP" if save_flag else "" # mark agent saved due to good performance
+            filename = save_sac_agent(agent, replay_buffer, f"{get_timestamp()}_sac_agent_final{name_appendix}")
+            flush_deferred_logs()
+            print(f"Saved final agent to file: {filename}")
+    flush_deferred_logs() # write the remaining logs before any output of the caller
+
+def _train_sac_environment(episodes, update_interval, updates, env, agent, replay_buffer, testenv, test_interval, 
+                           test_episodes, save_threshold, epoch_save_interval, total_steps, use_progress_bar, seed):
+    """Train the agent for the given amount of episodes in a single environment. Returns the amount 
+    of successful steps, the amount of non-failed episodes and the total amount of steps."""
+    log_mode = "deferred" if use_progress_bar else "default"
     observation, info = env.initialize(seed=seed) # start training with fresh environment
     successful_steps = 0 # steps with positive reward
     non_failed_episodes = 0 # episodes which don't terminate in the first step
-    save_flag = False # determine whether the agent should be saved (based on performance)
     for episode in range(episodes):
         if use_progress_bar:
+            flush_deferred_logs() # write the logs of the previous episode before the new progress bar
             progress_bar = tqdm(
                 total=env.max_steps_per_episode, desc=f"Episode {episode+1} steps", ncols=100
             )
@@ -176,9 +241,7 @@ def _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, rep
             # equal to the updates parameter. As SAC is an off-policy algorithm, it is not trained 
             # on the data of the current step, but on random samples from the replay buffer.
             if total_steps % update_interval == 0:
-                for _ in range(updates):
-                    o, a, r, o2, t = replay_buffer.sample()
-                    agent.update(o, a, r, o2, t)
+                _update_agent(agent, replay_buffer, updates)
             
             total_steps += 1
             observation = next_observation
@@ -188,37 +251,91 @@ def _train_sac(episodes, warmup_steps, update_interval, updates, env, agent, rep
         observation, info = env.reset()
         if use_progress_bar:
             progress_bar.close()
-            flush_deferred_logs() # only print logs after progress bar is finished
         _log_episode_stats(episode, current_episode_steps, agent.stats_log)
+        # Logs are written to the console by a background thread with a delay, so they are written 
+        # now to keep them between the progress bars. This also writes the deferred logs.
+        flush_deferred_logs()
+        _test_and_save_agent(episode, agent, replay_buffer, testenv, test_interval, test_episodes, 
+                             save_threshold, epoch_save_interval, use_progress_bar, seed)
+    return successful_steps, non_failed_episodes, total_steps
+
+def _train_sac_vector_environment(episodes, update_interval, updates, vector_env, agent, replay_buffer, testenv, 
+                                  test_interval, test_episodes, save_threshold, epoch_save_interval, total_steps, 
+                                  use_progress_bar, seed):
+    """Train the agent for the given amount of episodes in the environments of the vector environment. 
+    All environments are stepped together and their transitions are added to the replay buffer at once. 
+    Environments whose episode has ended are reset individually, so that the others can continue. 
+    Returns the amount of successful steps, the amount of non-failed episodes and the total amount of steps."""
+    log_mode = "deferred" if use_progress_bar else "default"
+    observations, infos = vector_env.initialize(seed=seed) # start training with fresh environments
+    episode_steps = np.zeros(vector_env.num_envs, dtype=np.int64) # steps of each environment's current episode
+    successful_steps = 0 # steps with positive reward
+    non_failed_episodes = 0 # episodes which don't terminate in the first step
+    episode = 0
+    if use_progress_bar:
+        flush_deferred_logs() # write the warmup logs before the progress bar
+        progress_bar = tqdm(total=episodes, desc="Episodes", ncols=100)
+    while episode < episodes:
+        # Select the actions of all environments based on their current observations.
+        actions = agent.act(observations)
+        vector_env.step_async(actions, log_mode=log_mode)
+        next_observations, rewards, terminateds, truncateds, infos = vector_env.step_wait()
+        episode_steps += 1
+        replay_buffer.add_batch(observations, actions, rewards, next_observations, terminateds)
+        successful_steps += int(np.count_nonzero(rewards > 0))
         
-        # Test the agent every test_interval episodes
-        if test_interval not in (None, -1) and (episode+1) % test_interval == 0:
-            average_episode_revenue = test_ptx_agent_from_train(
-                agent, testenv, episode+1, test_episodes, progress_bar, seed
-            )
-            save_flag = save_threshold is not None and average_episode_revenue >= save_threshold
-        # Save the agent every epoch_save_interval episodes and/or based on performance
-        if (epoch_save_interval not in (None, -1) and (episode+1) % epoch_save_interval == 0 or save_flag):
-            name_appendix = "_TOP" if save_flag else "" # mark agents saved due to good performance
-            filename = save_sac_agent(
-                agent, replay_buffer, f"{get_timestamp()}_sac_agent_e{episode+1}{name_appendix}"
-            )
-            print(f"Saved agent from episode {episode+1} to file: {filename}")
-            save_flag = False
-    log(f"Training Review - Number of successful steps: {successful_steps}, Total number of steps: "
-        f"{total_steps}, Number of non-failed episodes: {non_failed_episodes}", "episode")
-    # Final testing after training
-    if test_interval == -1:
+        # Train the agent every update_interval steps, with each environment's step counting as one step.
+        for _ in range(vector_env.num_envs):
+            if total_steps % update_interval == 0:
+                _update_agent(agent, replay_buffer, updates)
+            total_steps += 1
+        observations = next_observations
+        
+        for i in np.flatnonzero(terminateds | truncateds):
+            current_episode_steps = int(episode_steps[i])
+            episode_steps[i] = 0
+            if current_episode_steps > 1:
+                non_failed_episodes += 1
+            observations[i], info = vector_env.reset_environment(i)
+            if use_progress_bar:
+                progress_bar.update(1)
+            # all environments' steps trigger updates, so the episode spans about num_envs times its updates
+            _log_episode_stats(episode, current_episode_steps * vector_env.num_envs, agent.stats_log)
+            flush_deferred_logs() # write the logs of the episode now instead of during later steps
+            _test_and_save_agent(episode, agent, replay_buffer, testenv, test_interval, test_episodes, 
+                                 save_threshold, epoch_save_interval, use_progress_bar, seed)
+            episode += 1
+            if episode == episodes:
+                break
+    if use_progress_bar:
+        progress_bar.close()
+    return successful_steps, non_failed_episodes, total_steps
+
+def _update_agent(agent, replay_buffer, updates):
+    """Update the agent an amount of times equal to updates on random samples from the replay buffer."""
+    for _ in range(updates):
+        o, a, r, o2, t = replay_buffer.sample()
+        agent.update(o, a, r, o2, t)
+
+def _test_and_save_agent(episode, agent, replay_buffer, testenv, test_interval, test_episodes, 
+                         save_threshold, epoch_save_interval, use_progress_bar, seed):
+    """Test the agent every test_interval episodes and save it every epoch_save_interval 
+    episodes and/or if its average episode revenue in the test reaches the save_threshold."""
+    save_flag = False # determine whether the agent should be saved (based on performance)
+    # Test the agent every test_interval episodes
+    if test_interval not in (None, -1) and (episode+1) % test_interval == 0:
         average_episode_revenue = test_ptx_agent_from_train(
-            agent, testenv, episode+1, test_episodes, progress_bar, seed
+            agent, testenv, episode+1, test_episodes, use_progress_bar, seed
         )
         save_flag = save_threshold is not None and average_episode_revenue >= save_threshold
-    # Save the final agent
-    if epoch_save_interval == -1 or save_flag:
-            name_appendix = "_TOP" if save_flag else "" # mark agent saved due to good performance
-            filename = save_sac_agent(agent, replay_buffer, f"{get_timestamp()}_sac_agent_final{name_appendix}")
-            print(f"Saved final agent to file: {filename}")
-    
+    # Save the agent every epoch_save_interval episodes and/or based on performance
+    if (epoch_save_interval not in (None, -1) and (episode+1) % epoch_save_interval == 0 or save_flag):
+        name_appendix = "_TOP" if save_flag else "" # mark agents saved due to good performance
+        filename = save_sac_agent(
+            agent, replay_buffer, f"{get_timestamp()}_sac_agent_e{episode+1}{name_appendix}"
+        )
+        flush_deferred_logs()
+        print(f"Saved agent from episode {episode+1} to file: {filename}")
 
 def _log_episode_stats(episode, step, stats_log):
     """Log the stats of the last episode by taking the mean of all its steps' values."""
@@ -252,13 +369,23 @@ if __name__ == "__main__":
     parser.add_argument("--load", default=None, type=str)
     parser.add_argument("--device", choices=["cpu", "gpu"], default="cpu", type=str)
     parser.add_argument("--seed", default=None, type=int)
+    parser.add_argument("--envs", default=1, type=int)
+    parser.add_argument("--asyncenvs", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--cudagraph", action="store_true")
+    parser.add_argument("--gradaccum", default=1, type=int)
+    parser.add_argument("--bufferondevice", action="store_true")
+    parser.add_argument("--obsdtype", choices=["float32", "float16"], default="float32", type=str)
     args = parser.parse_args()
     
     disable_logger("main")
     log(f"Train with config: Environment: {args.env}, Episodes: {args.eps}, Warmup steps: {args.warmup}, Update " 
         f"interval: {args.updateevery}, Update amount: {args.updates}, Max steps per episode: {args.maxsteps}, Weather " 
         f"forecast days: {args.forecast}, Test interval: {args.test}, Test episodes: {args.testeps}, Save threshold: " 
-        f"{args.savethresh}, Epoch save interval: {args.save}, Device: {args.device}, Seed: {args.seed}", "episode")
+        f"{args.savethresh}, Epoch save interval: {args.save}, Device: {args.device}, Seed: {args.seed}, " 
+        f"Environments: {args.envs}, Async environments: {args.asyncenvs}, Compile networks: {args.compile}, " 
+        f"Cuda graph: {args.cudagraph}, Gradient accumulation steps: {args.gradaccum}, Replay buffer on device: " 
+        f"{args.bufferondevice}, Observation dtype: {args.obsdtype}", "episode")
     
     if args.load is not None:
         agent, replay_buffer, seed = load_sac_agent(args.load, seed=args.seed)
@@ -272,13 +399,19 @@ if __name__ == "__main__":
         train_gym_half_cheetah(
             episodes=args.eps, warmup_steps=args.warmup, update_interval=args.updateevery, updates=args.updates, 
             max_steps_per_episode=args.maxsteps, test_interval=args.test, test_episodes=args.testeps, save_threshold=args.savethresh, 
-            epoch_save_interval=args.save, device=args.device, agent=agent, replay_buffer=replay_buffer, seed=seed
+            epoch_save_interval=args.save, device=args.device, agent=agent, replay_buffer=replay_buffer, seed=seed, 
+            compile_networks=args.compile, use_cuda_graph=args.cudagraph, grad_accum_steps=args.gradaccum, 
+            store_on_device=args.bufferondevice, observation_dtype=np.dtype(args.obsdtype)
         )
     elif args.env == "ptx":
         train_ptx_system(
             episodes=args.eps, warmup_steps=args.warmup, update_interval=args.updateevery, updates=args.updates,
             max_steps_per_episode=args.maxsteps, weather_forecast_days=args.forecast, test_interval=args.test, 
             test_episodes=args.testeps, save_threshold=args.savethresh, epoch_save_interval=args.save, 
-            device=args.device, agent=agent, replay_buffer=replay_buffer, seed=seed
+            device=args.device, agent=agent, replay_buffer=replay_buffer, seed=seed, num_envs=args.envs, 
+            async_envs=args.asyncenvs, compile_networks=args.compile, use_cuda_graph=args.cudagraph, 
+            grad_accum_steps=args.gradaccum, store_on_device=args.bufferondevice, 
+            observation_dtype=np.dtype(args.obsdtype)
         )
+    flush_deferred_logs()
     print("Training complete.")
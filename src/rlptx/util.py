@@ -1,4 +1,6 @@
 import os
+from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
 import datetime
 import yaml
@@ -18,13 +20,22 @@ def get_root_path(project_folder=PROJECT_FOLDER):
 PROJECT_DIR = get_root_path()
 DATA_DIR = PROJECT_DIR / "data"
 
+# use the fast libyaml based loader if pyyaml was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def mkdir(path):
     os.makedirs(PROJECT_DIR / path, exist_ok=True)
 
 def open_yaml_file(path):
+    """Load a yaml file. The parsed content is cached per path and modification time, so 
+    loading an unchanged file again only returns a copy instead of parsing it again."""
+    return deepcopy(_load_yaml_file(str(path), os.path.getmtime(path)))
+
+@lru_cache(maxsize=16)
+def _load_yaml_file(path, mtime):
     with open(path) as file:
-        yaml_object = yaml.load(file, Loader=yaml.FullLoader)
+        yaml_object = yaml.load(file, Loader=YAML_LOADER)
     return yaml_object
 
 def get_most_recent_file(path, search_string=""):
@@ -34,6 +45,21 @@ def get_most_recent_file(path, search_string=""):
     filename = [f for f in files if search_string in f.name or search_string == ""][0].name
     return filename.split(".")[0] # remove extension
 
+class LazyStr:
+    """String whose %-formatting is deferred until it is converted with str() or repr(). 
+    This avoids formatting messages like statuses which are only used if they are logged."""
+    __slots__ = ("template", "args")
+    
+    def __init__(self, template, args):
+        self.template = template
+        self.args = args
+    
+    def __str__(self):
+        return self.template % self.args
+    
+    def __repr__(self):
+        return repr(str(self))
+
 def contains_only_unique_elements(list):
     return len(list) == len(set(list))
 
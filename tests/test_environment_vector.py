@@ -0,0 +1,151 @@
+import numpy as np
+
+from rlptx import logger
+from rlptx.environment import environment
+from rlptx.environment.environment import PtxEnvironment
+from rlptx.environment.vector import VectorEnvironment, AsyncVectorEnvironment, OBSERVATION_DTYPE
+from rlptx.environment.weather import WeatherDataProvider
+from rlptx.logger import disable_logger, enable_logger
+from rlptx.ptx import load_project
+
+
+LOGGERS = ("main", "status", "reward", "episode")
+
+
+def create_environment(max_steps_per_episode=5, seed=1):
+    return PtxEnvironment(
+        load_project(), WeatherDataProvider(test_size=0.1, seed=seed), 
+        max_steps_per_episode=max_steps_per_episode, seed=seed
+    )
+
+def get_info_strings(info):
+    return {key: str(value) for key, value in info.items()}
+
+
+class TestVectorEnvironment():
+    
+    def setup_method(self):
+        for loggername in LOGGERS:
+            disable_logger(loggername)
+        self.vector_env = VectorEnvironment.from_environment(create_environment(), 3, seed=1)
+    
+    def teardown_method(self):
+        for loggername in LOGGERS:
+            enable_logger(loggername)
+    
+    def test_reset_environment__only_resets_index(self):
+        self.vector_env.initialize(seed=1)
+        self.vector_env.act(self.vector_env.sample_action())
+        
+        observation, info = self.vector_env.reset_environment(1)
+        
+        envs = self.vector_env.envs
+        assert envs[1].step == 0 and envs[1].episode == 2
+        assert all(env.step == 1 and env.episode == 1 for env in (envs[0], envs[2]))
+        assert observation.dtype == OBSERVATION_DTYPE
+        assert np.array_equal(observation, envs[1]._get_current_observation().astype(OBSERVATION_DTYPE))
+        assert info == {}
+    
+    def test_reset_environment__continues_after_episode_end(self):
+        observations, _ = self.vector_env.initialize(seed=1)
+        env = self.vector_env.envs[1]
+        
+        while not env.terminated and not env.truncated:
+            observations, _, terminateds, truncateds, _ = self.vector_env.act(self.vector_env.sample_action())
+        observations[1], _ = self.vector_env.reset_environment(1)
+        observations, _, terminateds, truncateds, _ = self.vector_env.act(self.vector_env.sample_action())
+        
+        assert env.episode == 2 and env.step == 1
+        assert observations.shape == (3, self.vector_env.observation_space_size)
+        assert observations.dtype == OBSERVATION_DTYPE
+    
+    def test_from_environment__episode_logs_contain_index(self, monkeypatch):
+        messages = []
+        monkeypatch.setattr(environment, "log", 
+                            lambda message, loggername="main", **kwargs: messages.append((loggername, message)))
+        self.vector_env.initialize(seed=1)
+        
+        while not all(env.terminated or env.truncated for env in self.vector_env.envs):
+            self.vector_env.act(self.vector_env.sample_action())
+        
+        episode_messages = [message for loggername, message in messages if loggername == "episode"]
+        assert all(message.startswith("Episode 1 - Total reward: ") for message in episode_messages)
+        assert sorted(message.rsplit(" - ", 1)[-1] for message in episode_messages) == [f"Env: {i}" for i in range(3)]
+    
+    def test_from_environment__single_environment_without_index(self):
+        env = self.vector_env.envs[0]
+        
+        vector_env = VectorEnvironment.from_environment(env, 1)
+        
+        assert vector_env.envs == [env] and env.vector_index is None
+
+class TestAsyncVectorEnvironment():
+    
+    def setup_method(self):
+        for loggername in LOGGERS:
+            disable_logger(loggername)
+        self.vector_env = VectorEnvironment.from_environment(create_environment(), 2, seed=1)
+        self.async_vector_env = AsyncVectorEnvironment.from_environment(create_environment(), 2, seed=1)
+    
+    def teardown_method(self):
+        self.async_vector_env.close()
+        for loggername in LOGGERS:
+            enable_logger(loggername)
+    
+    def _run(self, vector_env, steps=12):
+        """Step the vector environment with fixed actions and return the results of all calls."""
+        rng = np.random.default_rng(0)
+        results = [vector_env.initialize(seed=1)]
+        for _ in range(steps):
+            actions = rng.uniform(-1, 1, (vector_env.num_envs, vector_env.action_space_size)).astype(np.float32)
+            vector_env.step_async(actions, log_mode="default")
+            results.append(vector_env.step_wait())
+            _, _, terminateds, truncateds, _ = results[-1]
+            for i in np.flatnonzero(terminateds | truncateds):
+                results.append(vector_env.reset_environment(i))
+        return results
+    
+    def test_step__equal_to_vector_environment(self):
+        results = self._run(self.vector_env)
+        async_results = self._run(self.async_vector_env)
+        
+        assert len(results) == len(async_results)
+        for result, async_result in zip(results, async_results):
+            assert len(result) == len(async_result)
+            for values, async_values in zip(result, async_result):
+                if isinstance(values, np.ndarray):
+                    assert values.dtype == async_values.dtype
+                    assert np.array_equal(values, async_values)
+                elif isinstance(values, list):
+                    # the messages of the infos are only formatted when converted to strings
+                    assert list(map(get_info_strings, values)) == list(map(get_info_strings, async_values))
+                else:
+                    assert get_info_strings(values) == get_info_strings(async_values)
+    
+    def test_step__logs_written_by_main_process(self, monkeypatch):
+        messages = []
+        def record(message, loggername="main", *args, **kwargs):
+            if loggername not in logger.disabled_loggers:
+                messages.append((loggername, message))
+        monkeypatch.setattr(environment, "log", record)
+        monkeypatch.setattr(logger, "log", record)
+        enable_logger("episode")
+        # the workers only log to the loggers which are enabled when they are started
+        self.async_vector_env.close()
+        self.async_vector_env = AsyncVectorEnvironment.from_environment(create_environment(), 2, seed=1)
+        
+        self._run(self.vector_env)
+        vector_env_messages = list(messages)
+        messages.clear()
+        self._run(self.async_vector_env)
+        
+        assert any(loggername == "episode" for loggername, _ in vector_env_messages)
+        assert messages == vector_env_messages
+    
+    def test_sample_action__shape(self):
+        self.async_vector_env.initialize(seed=1)
+        
+        actions = self.async_vector_env.sample_action()
+        
+        assert actions.shape == (2, self.async_vector_env.action_space_size)
+        assert actions.dtype == np.float32
@@ -0,0 +1,37 @@
+import pickle
+
+import numpy as np
+
+from rlptx.environment.weather import WeatherDataProvider
+
+
+class TestWeatherDataProvider():
+    
+    def setup_method(self):
+        self.weather = WeatherDataProvider(test_size=0.1, seed=1)
+    
+    def test_get_data__offset_not_applied(self):
+        self.weather.set_random_offset(24)
+        
+        data = self.weather.get_data()
+        
+        assert self.weather.offset > 0
+        assert all(len(values) == self.weather.get_data_length() for values in data.values())
+        shifted = self.weather.get_weather_from_tick_plus_n(0, 3)
+        assert np.array_equal(data["time"][self.weather.offset:self.weather.offset+3], shifted["time"])
+    
+    def test_get_data__train_and_test_split(self):
+        train, test = self.weather.get_data("train"), self.weather.get_data("test")
+        
+        assert len(train["time"]) == self.weather.get_data_length("train")
+        assert len(test["time"]) == self.weather.get_data_length("test")
+        assert np.array_equal(np.concatenate([train["time"], test["time"]]), self.weather.get_data()["time"])
+    
+    def test_pickle__only_column_arrays_kept(self):
+        state = self.weather.__getstate__()
+        
+        arrays = [value for value in state.values() if isinstance(value, (np.ndarray, dict, list))]
+        assert arrays == [self.weather._soa]
+        copy = pickle.loads(pickle.dumps(self.weather))
+        assert np.array_equal(copy.get_data("test")["time"], self.weather.get_data("test")["time"])
+        assert copy.get_weather_of_tick(5) == self.weather.get_weather_of_tick(5)
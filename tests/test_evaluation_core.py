@@ -0,0 +1,45 @@
+import numpy as np
+
+from rlptx.evaluation.core import load_log
+
+
+EPISODE_LINES = [
+    "16-10 04:49:06 - episode - INFO     - Warmup - 8 steps in 2 episodes (Total Reward: -20.0000 - Reward/Step: -2.5000)", 
+    "16-10 04:49:07 - episode - INFO     - Episode 1 - Total reward: -10.0000 - Reward/Step: -10.0000 - Steps: 1 - " 
+    "Total revenue: 0.0000 - Env: 1", 
+    "16-10 04:49:07 - episode - INFO     - Episode 1 - Total reward: 2.5000 - Reward/Step: 0.5000 - Steps: 5 - " 
+    "Total revenue: 12.0000 - Env: 0", 
+]
+
+
+def write_log(tmp_path, lines):
+    (tmp_path / "log.txt").write_text("\n".join(lines) + "\n")
+    return str(tmp_path) + "/"
+
+
+class TestLoadLog():
+    
+    def test_load_log__episode_lines(self, tmp_path):
+        lines = [line.replace(" - Env: 1", "").replace(" - Env: 0", "") for line in EPISODE_LINES]
+        
+        log_df = load_log("log", "episode", path=write_log(tmp_path, lines))
+        
+        assert list(log_df.columns) == ["Total reward", "Reward/Step", "Steps", "Total revenue"]
+        assert np.array_equal(log_df["Steps"], [1, 5])
+    
+    def test_load_log__episode_lines_of_vector_environment(self, tmp_path):
+        log_df = load_log("log", "episode", path=write_log(tmp_path, EPISODE_LINES))
+        
+        assert list(log_df.columns) == ["Total reward", "Reward/Step", "Steps", "Total revenue", "Env"]
+        assert np.array_equal(log_df["Env"], [1, 0])
+        assert np.array_equal(log_df["Total reward"], [-10, 2.5])
+    
+    def test_load_log__evaluation_lines_of_vector_environment(self, tmp_path):
+        lines = [f"16-10 04:49:07 - evaluation - INFO     - Cycle 1 Episode 2 Step {step} Env 1 - " 
+                 f"Reward: {step / 2:.4f}, Episode revenue: 3.0000" for step in (1, 2)]
+        
+        log_df = load_log("log", "evaluation", path=write_log(tmp_path, lines))
+        
+        assert list(log_df.columns) == ["Cycle", "Episode", "Step", "Env", "Reward", "Episode revenue"]
+        assert np.array_equal(log_df["Env"], [1, 1])
+        assert np.array_equal(log_df["Reward"], [0.5, 1])
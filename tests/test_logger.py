@@ -0,0 +1,89 @@
+import threading
+
+import rlptx.logger as logger
+from rlptx.logger import log, configure_logger, flush_deferred_logs, reset_loggers
+
+
+class TestLogger():
+    
+    def setup_method(self):
+        reset_loggers()
+    
+    def teardown_method(self):
+        reset_loggers()
+    
+    def _configure(self, tmp_path, loggername):
+        configure_logger(loggername, path=tmp_path, filename="log.txt")
+        return logger.loggers[loggername].handlers[1]
+    
+    def _read_messages(self, handler):
+        handler.flush()
+        with open(handler.baseFilename) as file:
+            return [line.rstrip("\n").split(" - ")[-1] for line in file]
+    
+    def test_log__deferred_held_back_until_non_deferred_log(self, tmp_path):
+        handler = self._configure(tmp_path, "test_deferred")
+        
+        log("first", "test_deferred", deferred=True)
+        log("second", "test_deferred", deferred=True)
+        logger._write_logs()
+        handler.flush()
+        
+        assert handler.stream is None # nothing written yet, so the file was not even opened
+        log("third", "test_deferred")
+        logger._write_logs()
+        assert self._read_messages(handler) == ["first", "second", "third"]
+    
+    def test_flush_deferred_logs__order_preserved(self, tmp_path):
+        handler = self._configure(tmp_path, "test_order")
+        messages = [f"message {i}" for i in range(3 * logger.LOG_BUFFER_SIZE)]
+        
+        for i, message in enumerate(messages):
+            log(message, "test_order", deferred=(i % 3 == 0))
+        flush_deferred_logs()
+        
+        assert self._read_messages(handler) == messages
+    
+    def test_reset_loggers__file_handler_flushed(self, tmp_path):
+        handler = self._configure(tmp_path, "test_reset")
+        
+        log("message", "test_reset", deferred=True)
+        reset_loggers()
+        
+        assert "test_reset" not in logger.loggers
+        with open(handler.baseFilename) as file:
+            assert file.read().rstrip("\n").endswith("message")
+    
+    def test_start_flush_thread__started_once(self, monkeypatch):
+        monkeypatch.setattr(logger, "_flush_thread", None)
+        started = []
+        original_start = threading.Thread.start
+        def start(thread):
+            if thread.name == "log-flush":
+                started.append(thread)
+            original_start(thread)
+        monkeypatch.setattr(threading.Thread, "start", start)
+        
+        threads = [threading.Thread(target=logger._start_flush_thread) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(started) == 1
+    
+    def test_forward_logs__written_by_other_logger(self, tmp_path, monkeypatch):
+        handler = self._configure(tmp_path, "test_forward")
+        monkeypatch.setattr(logger, "_forwarded_logs", None)
+        
+        logger.forward_logs()
+        log("first %s", "test_forward", deferred=True, args=(1,))
+        log("second", "test_forward", level=logger.Level.WARNING)
+        logs = logger.pop_forwarded_logs()
+        logger._forwarded_logs = None
+        logger.write_forwarded_logs(logs)
+        flush_deferred_logs()
+        
+        assert logs == [("test_forward", logger.logging.INFO, "first 1", True), 
+                        ("test_forward", logger.logging.WARNING, "second", False)]
+        assert self._read_messages(handler) == ["first 1", "second"]
@@ -1,3 +1,5 @@
+from copy import copy
+
 from rlptx.ptx.commodity import Commodity
 from rlptx.ptx.framework import PtxSystem
 
@@ -75,3 +77,42 @@ class TestConversionComponent():
         nquantity = values[0]
         assert nquantity == 1
         assert not exact_completion
+    
+    def test_release_and_acquire_commodity__reused(self):
+        pool = []
+        self.c.available_quantity = 1
+        old = self.c.clone(pool)
+        Commodity.release(old, pool)
+        
+        new = self.c.clone(pool)
+        
+        assert new is old
+        assert pool == []
+        assert new.available_quantity == 1
+        assert new.observation_spec == self.c.observation_spec
+    
+    def test_copy__not_reused_without_pool(self):
+        pool = []
+        old = copy(self.c)
+        Commodity.release(old, pool)
+        
+        new = copy(self.c)
+        
+        assert new is not old
+        assert pool == [old]
+        assert old.available_quantity == 0
+    
+    def test_copy__adjusted_specs_kept(self):
+        self.c.available_quantity = 1
+        self.c.observation_spec["available_quantity"] = (False,)
+        self.c.tracked_attributes = {"available_quantity": (1, 1)}
+        
+        new = copy(self.c)
+        
+        assert new is not self.c
+        assert new.name == self.c.name and new.available_quantity == 1
+        assert new.observation_spec == self.c.observation_spec
+        assert new.observation_spec is not self.c.observation_spec
+        assert new.action_spec == self.c.action_spec
+        assert new.action_spec is not self.c.action_spec
+        assert new.tracked_attributes == {}
@@ -319,6 +319,17 @@ class TestConversionComponent():
         assert nquantity == approx(0.3)
         assert nnew_load == approx(0.8)
         assert not exact_completion
+    
+    def test_update_tracked_attributes__dict_difference(self):
+        self.cc.consumed_commodities = {"Electricity": 1.0, "Water": 0.5}
+        self.cc.update_tracked_attributes(["[dict]consumed_commodities"])
+        self.cc.consumed_commodities["Electricity"] = 3.0
+        
+        self.cc.update_tracked_attributes(["[dict]consumed_commodities"])
+        
+        tracked = self.cc.tracked_attributes["consumed_commodities"]
+        assert tracked["Electricity"] == (3.0, 2.0)
+        assert tracked["Water"] == (0.5, 0)
 
 
 class TestStorageComponent():
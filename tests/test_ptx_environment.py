@@ -0,0 +1,74 @@
+import numpy as np
+
+from rlptx.environment.environment import PtxEnvironment, _scale_observation
+from rlptx.environment.weather import WeatherDataProvider
+from rlptx.logger import disable_logger, enable_logger
+from rlptx.ptx import load_project
+
+
+LOGGERS = ("main", "status", "reward", "episode")
+
+
+class TestPtxEnvironment():
+    
+    def setup_method(self):
+        for loggername in LOGGERS:
+            disable_logger(loggername)
+        self.env = PtxEnvironment(
+            load_project(), WeatherDataProvider(test_size=0.1, seed=1), max_steps_per_episode=5, seed=1
+        )
+    
+    def teardown_method(self):
+        for loggername in LOGGERS:
+            enable_logger(loggername)
+    
+    def test_reset__released_system_not_reachable(self):
+        original_commodities = set(map(id, self.env._original_ptx_system.commodities.values()))
+        self.env.initialize(seed=1)
+        self.env.act(self.env.sample_action())
+        first_system = self.env.ptx_system
+        first_commodities = set(map(id, first_system.commodities.values()))
+        
+        self.env.reset()
+        second_system = self.env.ptx_system
+        self.env.act(self.env.sample_action())
+        self.env.reset()
+        third_system = self.env.ptx_system
+        
+        assert first_system.commodities == {} and second_system.commodities == {}
+        third_commodities = set(map(id, third_system.commodities.values()))
+        assert third_commodities.isdisjoint(original_commodities)
+        # the released commodities are reused, but only by the newest system
+        assert third_commodities == first_commodities
+        assert np.all(np.isfinite(self.env._get_current_observation()))
+    
+    def test_reset__original_system_unchanged(self):
+        original = self.env._original_ptx_system
+        quantities = {name: commodity.available_quantity for name, commodity in original.commodities.items()}
+        self.env.initialize(seed=1)
+        
+        for _ in range(3):
+            self.env.act(self.env.sample_action())
+            self.env.reset()
+        
+        assert {name: commodity.available_quantity for name, commodity in original.commodities.items()} == quantities
+        assert original._commodity_pool is self.env.ptx_system._commodity_pool
+
+
+class TestScaleObservation():
+    
+    def test_scale_observation__equal_to_interp(self):
+        rng = np.random.default_rng(0)
+        lower_bounds = rng.uniform(-10, 0, 50)
+        upper_bounds = lower_bounds + rng.uniform(0.1, 10, 50)
+        # values inside the bounds, outside of them and exactly on them
+        observation = rng.uniform(-20, 20, 50)
+        observation[:5] = lower_bounds[:5]
+        observation[5:10] = upper_bounds[5:10]
+        slopes = 2. / (upper_bounds - lower_bounds)
+        
+        scaled = _scale_observation(observation, lower_bounds, upper_bounds, slopes)
+        
+        expected = [np.interp(value, [lower, upper], [-1, 1]) 
+                    for value, lower, upper in zip(observation, lower_bounds, upper_bounds)]
+        assert np.array_equal(scaled, expected)
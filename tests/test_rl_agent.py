@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+import torch
+
+from rlptx.rl.agent import SacAgent
+from rlptx.rl.core import ReplayBuffer
+
+
+OBSERVATION_SIZE = 4
+ACTION_SIZE = 2
+ACTION_BOUNDS = ([-1., -1.], [1., 1.])
+
+
+def create_agent(grad_accum_steps=1, compile_networks=False):
+    torch.manual_seed(0) # same initial networks for all agents
+    return SacAgent(OBSERVATION_SIZE, ACTION_SIZE, ACTION_BOUNDS, device="cpu", 
+                    grad_accum_steps=grad_accum_steps, compile_networks=compile_networks)
+
+def get_parameters(agent):
+    return [parameter.detach().clone() for parameter in 
+            (*agent.critic.parameters(), *agent.actor.parameters(), agent.log_entropy_regularization)]
+
+def get_gradients(agent):
+    return [parameter.grad.clone() for parameter in 
+            (*agent.critic.parameters(), *agent.actor.parameters(), agent.log_entropy_regularization)]
+
+def apply_averaged_step(agent, batches):
+    """Step the optimizers of the agent once on the losses averaged over the batches."""
+    optimizers = (agent.critic.optimizer, agent.actor.optimizer, agent.entropy_optimizer)
+    for optimizer in optimizers:
+        optimizer.zero_grad()
+    entropy_regularization = torch.exp(agent.log_entropy_regularization.detach())
+    critic_losses, actor_losses = [], []
+    for observation, action, reward, next_observation, terminated in batches:
+        observation, action, next_observation = (
+            torch.squeeze(observation), torch.squeeze(action), torch.squeeze(next_observation)
+        )
+        critic_losses.append(agent._calculate_critic_loss(
+            observation, action, next_observation, reward, terminated, entropy_regularization
+        ))
+        loss_actor, log_prob_actor = agent._calculate_actor_loss(observation, entropy_regularization)
+        actor_losses += [loss_actor, agent._calculate_entropy_loss(log_prob_actor)]
+    (sum(critic_losses) / len(batches)).backward()
+    agent.critic.requires_grad_(False) # the actor loss does not train the critic
+    (sum(actor_losses) / len(batches)).backward()
+    agent.critic.requires_grad_(True)
+    for optimizer in optimizers:
+        optimizer.step()
+
+
+class TestSacAgent():
+    
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        replay_buffer = ReplayBuffer(8, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu")
+        for _ in range(8):
+            replay_buffer.add(rng.uniform(-1, 1, OBSERVATION_SIZE), rng.uniform(-1, 1, ACTION_SIZE), 
+                              rng.uniform(-1, 1), rng.uniform(-1, 1, OBSERVATION_SIZE), False)
+        self.batches = [replay_buffer.sample() for _ in range(4)]
+    
+    def test_update__grad_accum_equal_to_averaged_step(self, monkeypatch):
+        # sample actions without noise, so that the losses of each batch are deterministic
+        monkeypatch.setattr(torch, "randn_like", torch.zeros_like)
+        agent = create_agent(grad_accum_steps=2)
+        reference_agent = create_agent()
+        
+        agent.update(*self.batches[0])
+        agent.update(*self.batches[1])
+        apply_averaged_step(reference_agent, self.batches[:2])
+        
+        for parameter, reference_parameter in zip(get_parameters(agent), get_parameters(reference_agent)):
+            assert torch.allclose(parameter, reference_parameter, atol=1e-6)
+    
+    def test_update__grad_accum_steps_only_every_nth_update(self):
+        agent = create_agent(grad_accum_steps=2)
+        initial_parameters = get_parameters(agent)
+        initial_target_parameters = [parameter.clone() for parameter in agent.target_critic.parameters()]
+        
+        agent.update(*self.batches[0])
+        
+        for parameter, initial_parameter in zip(get_parameters(agent), initial_parameters):
+            assert torch.equal(parameter, initial_parameter)
+        for parameter, initial_parameter in zip(agent.target_critic.parameters(), initial_target_parameters):
+            assert torch.equal(parameter, initial_parameter)
+        agent.update(*self.batches[1])
+        assert not torch.equal(get_parameters(agent)[0], initial_parameters[0])
+        assert not torch.equal(next(agent.target_critic.parameters()), initial_target_parameters[0])
+        agent.update(*self.batches[2])
+        agent.update(*self.batches[3])
+        for optimizer in (agent.critic.optimizer, agent.actor.optimizer, agent.entropy_optimizer):
+            for state in optimizer.state.values():
+                assert int(state["step"]) == 2
+    
+    def test_update__grad_accum_stats_per_update(self):
+        agent = create_agent(grad_accum_steps=2)
+        
+        for batch in self.batches[:3]:
+            agent.update(*batch)
+        
+        assert all(len(values) == 3 for values in agent.stats_log.values())
+        assert all(np.isfinite(values).all() for values in agent.stats_log.values())
+    
+    def test_init__cuda_graph_requires_gpu(self):
+        with pytest.raises(AssertionError, match="gpus"):
+            SacAgent(OBSERVATION_SIZE, ACTION_SIZE, ACTION_BOUNDS, device="cpu", use_cuda_graph=True)
+    
+    def test_act__compiled_equal_to_eager(self):
+        compiled_agent = create_agent(compile_networks=True)
+        agent = create_agent()
+        observations = np.random.default_rng(0).uniform(-1, 1, (3, OBSERVATION_SIZE)).astype(np.float32)
+        
+        compiled_actions = compiled_agent.act(observations, evaluation_mode=True)
+        actions = agent.act(observations, evaluation_mode=True)
+        
+        assert np.allclose(compiled_actions, actions, atol=1e-6)
@@ -0,0 +1,164 @@
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from rlptx.rl.agent import SacAgent
+from rlptx.rl.core import ReplayBuffer, save_sac_agent, load_sac_agent, REPLAY_BUFFER_ARRAYS, REPLAY_BUFFER_DIR_SUFFIX
+
+
+OBSERVATION_SIZE = 3
+ACTION_SIZE = 2
+# store_on_device and observation_dtype of each storage mode of the replay buffer
+STORAGE_MODES = [(False, np.float32), (False, np.float16), (True, np.float32), (True, np.float16)]
+
+
+def create_transitions(amount, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(-1, 1, (amount, OBSERVATION_SIZE)).astype(np.float32), 
+            rng.uniform(-1, 1, (amount, ACTION_SIZE)).astype(np.float32), 
+            rng.uniform(-1, 1, amount).astype(np.float32), 
+            rng.uniform(-1, 1, (amount, OBSERVATION_SIZE)).astype(np.float32), 
+            rng.uniform(size=amount) < 0.5)
+
+def get_stored(replay_buffer):
+    """Return the stored transitions as numpy arrays in the order of the replay buffer arrays."""
+    data = replay_buffer.get_data()
+    return [np.asarray(data[name]) for name in REPLAY_BUFFER_ARRAYS]
+
+def round_transitions(transitions, observation_dtype):
+    observations, actions, rewards, next_observations, terminateds = transitions
+    return (observations.astype(observation_dtype), actions, rewards, 
+            next_observations.astype(observation_dtype), terminateds)
+
+
+class TestReplayBuffer():
+    
+    @pytest.mark.parametrize("store_on_device, observation_dtype", STORAGE_MODES)
+    def test_add__wraps_around(self, store_on_device, observation_dtype):
+        replay_buffer = ReplayBuffer(3, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu", 
+                                     store_on_device=store_on_device, observation_dtype=observation_dtype)
+        transitions = create_transitions(4)
+        
+        for i in range(3):
+            replay_buffer.add(*(values[i] for values in transitions))
+            assert replay_buffer.full == (i == 2)
+        replay_buffer.add(*(values[3] for values in transitions))
+        
+        assert replay_buffer.index == 1 and replay_buffer.full
+        expected = round_transitions(transitions, observation_dtype)
+        for stored, values in zip(get_stored(replay_buffer), expected):
+            assert np.array_equal(stored, values[[3, 1, 2]])
+    
+    @pytest.mark.parametrize("store_on_device, observation_dtype", STORAGE_MODES)
+    def test_add_batch__wraps_around(self, store_on_device, observation_dtype):
+        replay_buffer = ReplayBuffer(5, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu", 
+                                     store_on_device=store_on_device, observation_dtype=observation_dtype)
+        first_batch = create_transitions(3, seed=1)
+        second_batch = create_transitions(4, seed=2)
+        
+        replay_buffer.add_batch(*first_batch)
+        assert replay_buffer.index == 3 and not replay_buffer.full
+        replay_buffer.add_batch(*second_batch)
+        
+        assert replay_buffer.index == 2 and replay_buffer.full
+        expected = zip(round_transitions(first_batch, observation_dtype), 
+                       round_transitions(second_batch, observation_dtype))
+        for stored, (first_values, second_values) in zip(get_stored(replay_buffer), expected):
+            assert np.array_equal(stored[[3, 4, 0, 1]], second_values)
+            assert np.array_equal(stored[2], first_values[2])
+    
+    def test_add_batch__fills_exactly(self):
+        replay_buffer = ReplayBuffer(4, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu")
+        
+        replay_buffer.add_batch(*create_transitions(4))
+        
+        assert replay_buffer.index == 0 and replay_buffer.full
+    
+    @pytest.mark.parametrize("store_on_device, observation_dtype", STORAGE_MODES)
+    def test_sample__shapes_and_dtypes(self, store_on_device, observation_dtype):
+        replay_buffer = ReplayBuffer(8, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu", 
+                                     store_on_device=store_on_device, observation_dtype=observation_dtype)
+        transitions = create_transitions(6)
+        replay_buffer.add_batch(*transitions)
+        
+        observations, actions, rewards, next_observations, terminateds = replay_buffer.sample(5)
+        
+        assert observations.shape == next_observations.shape == (5, OBSERVATION_SIZE)
+        assert actions.shape == (5, ACTION_SIZE)
+        assert rewards.shape == terminateds.shape == (5,)
+        for tensor in (observations, actions, rewards, next_observations):
+            assert tensor.dtype == torch.float32
+        assert terminateds.dtype == torch.bool
+        # every sampled transition is one of the added ones (only filled rows are sampled)
+        expected = round_transitions(transitions, observation_dtype)
+        for i in range(5):
+            row = int(np.flatnonzero(np.all(expected[1] == actions[i].numpy(), axis=1))[0])
+            sample = (observations, actions, rewards, next_observations, terminateds)
+            for values, sampled in zip(expected, sample):
+                assert np.array_equal(np.asarray(values[row], dtype=sampled.numpy().dtype), sampled[i].numpy())
+    
+    def test_sample__seeded(self):
+        replay_buffers = [ReplayBuffer(8, OBSERVATION_SIZE, ACTION_SIZE, seed=3, device="cpu") for _ in range(2)]
+        for replay_buffer in replay_buffers:
+            replay_buffer.add_batch(*create_transitions(8))
+        
+        first_sample, second_sample = (replay_buffer.sample(4) for replay_buffer in replay_buffers)
+        
+        assert all(torch.equal(first, second) for first, second in zip(first_sample, second_sample))
+
+
+class TestSaveAndLoadSacAgent():
+    
+    def setup_method(self):
+        torch.manual_seed(0)
+        self.agent = SacAgent(OBSERVATION_SIZE, ACTION_SIZE, ([-1., -1.], [1., 1.]), device="cpu", seed=0)
+        self.replay_buffer = ReplayBuffer(5, OBSERVATION_SIZE, ACTION_SIZE, seed=0, device="cpu")
+        self.replay_buffer.add_batch(*create_transitions(4))
+        self.replay_buffer.add_batch(*create_transitions(3, seed=1))
+    
+    def _assert_loaded(self, agent, replay_buffer):
+        assert replay_buffer.index == self.replay_buffer.index and replay_buffer.full == self.replay_buffer.full
+        for loaded, stored in zip(get_stored(replay_buffer), get_stored(self.replay_buffer)):
+            assert np.array_equal(loaded, stored)
+        for loaded, saved in zip(agent.actor.state_dict().values(), self.agent.actor.state_dict().values()):
+            assert torch.equal(loaded, saved)
+        for loaded, saved in zip(agent.target_critic.state_dict().values(), 
+                                 self.agent.target_critic.state_dict().values()):
+            assert torch.equal(loaded, saved)
+        observations, _, rewards, _, terminateds = replay_buffer.sample(4)
+        assert observations.shape == (4, OBSERVATION_SIZE)
+        assert rewards.shape == (4,) and terminateds.dtype == torch.bool
+    
+    def test_save_and_load__round_trip(self, tmp_path):
+        path = str(tmp_path) + "/"
+        
+        save_sac_agent(self.agent, self.replay_buffer, "agent", path=path)
+        agent, replay_buffer, seed = load_sac_agent("agent", path=path)
+        
+        assert seed == 0
+        self._assert_loaded(agent, replay_buffer)
+        # the memory-mapped arrays are copy-on-write, so the saved files are not changed
+        replay_buffer.add_batch(*create_transitions(5, seed=2))
+        _, reloaded_buffer, _ = load_sac_agent("agent", path=path)
+        for loaded, stored in zip(get_stored(reloaded_buffer), get_stored(self.replay_buffer)):
+            assert np.array_equal(loaded, stored)
+    
+    def test_load__arrays_in_file(self, tmp_path):
+        path = str(tmp_path) + "/"
+        file_path = save_sac_agent(self.agent, self.replay_buffer, "agent", path=path)
+        # older files contain the arrays themselves with a trailing dimension for rewards and terminateds
+        model = torch.load(file_path, weights_only=True)
+        data = self.replay_buffer.get_data()
+        for name in REPLAY_BUFFER_ARRAYS:
+            model["replay_buffer"][name] = np.array(data[name])
+        for name in ("rewards", "terminateds"):
+            model["replay_buffer"][name] = model["replay_buffer"][name].reshape(-1, 1)
+        model["replay_buffer"]["actions"] = torch.from_numpy(model["replay_buffer"]["actions"])
+        torch.save(model, tmp_path / "old_agent.tar")
+        shutil.rmtree(tmp_path / ("agent" + REPLAY_BUFFER_DIR_SUFFIX))
+        
+        agent, replay_buffer, _ = load_sac_agent("old_agent", path=path)
+        
+        self._assert_loaded(agent, replay_buffer)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from rlptx import train
+from rlptx.logger import disable_logger, enable_logger
+
+
+LOGGERS = ("main", "status", "reward", "episode", "agent")
+
+
+class TestTrainVectorEnvironment():
+    
+    def setup_method(self):
+        for loggername in LOGGERS:
+            disable_logger(loggername)
+    
+    def teardown_method(self):
+        for loggername in LOGGERS:
+            enable_logger(loggername)
+    
+    def _train(self, monkeypatch, num_envs, episodes=4, warmup_steps=8, max_steps_per_episode=5):
+        logged_episodes = []
+        monkeypatch.setattr(train, "_log_episode_stats", 
+                            lambda episode, step, stats_log: logged_episodes.append((episode, step)))
+        agent, replay_buffer, env = train.train_ptx_system(
+            episodes=episodes, warmup_steps=warmup_steps, max_steps_per_episode=max_steps_per_episode, 
+            test_interval=None, save_threshold=None, progress_bar=False, seed=1, num_envs=num_envs
+        )
+        return agent, replay_buffer, logged_episodes
+    
+    def test_train__episodes_counted_over_environments(self, monkeypatch):
+        agent, replay_buffer, logged_episodes = self._train(monkeypatch, num_envs=2)
+        
+        assert [episode for episode, _ in logged_episodes] == [0, 1, 2, 3]
+    
+    def test_train__episode_stats_window_covers_all_environments(self, monkeypatch):
+        agent, replay_buffer, logged_episodes = self._train(monkeypatch, num_envs=2)
+        
+        # every step of an episode is taken together with a step of the other environment
+        assert all(step % 2 == 0 and 2 <= step <= 10 for _, step in logged_episodes)
+    
+    def test_train__one_update_per_transition(self, monkeypatch):
+        agent, replay_buffer, _ = self._train(monkeypatch, num_envs=3)
+        
+        updates = len(agent.stats_log["loss_actor"])
+        warmup_transitions = replay_buffer.index - updates
+        assert updates > 0 and updates % 3 == 0
+        assert 8 <= warmup_transitions < 8 + 5
+        assert np.all(np.isfinite(replay_buffer.observations[:replay_buffer.index]))